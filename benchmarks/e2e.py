@@ -0,0 +1,258 @@
+"""
+End-to-end load benchmark: runs the real service (main.py) against a local
+nats-server and local Telegram/OpenAI/Gemini stubs, feeds it synthetic
+webhook updates and reports throughput, latency and peak RSS as JSON.
+
+    python -m benchmarks.e2e --jobs 200 --rate 2 --durations 3,15,60 \
+        --openai-profile latency=1.5,jitter=0.5,errors=0.01 --out bench.json
+
+A nats-server binary on PATH is started automatically unless --nats-url is
+given. MySQL is optional; without it archive/usage writes fail and are logged.
+"""
+import os
+import sys
+import json
+import math
+import time
+import wave
+import shutil
+import signal
+import random
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+import anyio
+import httpx
+import uvicorn
+
+from benchmarks.stubs import Profile, TelegramStub, OpenAIStub, GeminiStub
+
+ROOT = Path(__file__).resolve().parent.parent
+TOKEN = "bench"
+FROM_ID = 1000001
+FAILURE_MARKERS = ("encouraging affirmation", "Oops")
+
+def percentiles(samples):
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        'count': len(ordered),
+        'p50': round(pick(0.50), 4),
+        'p95': round(pick(0.95), 4),
+        'p99': round(pick(0.99), 4),
+    }
+
+def write_wav(path: Path, seconds: float, rate: int = 16000):
+    frames = int(seconds * rate)
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        chunk = bytearray()
+        for i in range(frames):
+            sample = int(8000 * math.sin(2 * math.pi * 440 * i / rate)) if (i // rate) % 3 else 0
+            chunk += sample.to_bytes(2, "little", signed=True)
+        w.writeframes(bytes(chunk))
+
+def peak_rss_mb(pid: int):
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+async def serve_stub(app, port, tg):
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", loop="none"))
+    tg.start_soon(server.serve)
+    while not server.started:
+        await anyio.sleep(0.05)
+    return server
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Service exited with {process.returncode} before becoming ready")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return time.monotonic()
+            except httpx.RequestError:
+                pass
+            await anyio.sleep(0.1)
+    raise TimeoutError("Service did not become ready")
+
+def start_nats(nats_url, port: int):
+    """Starts a local nats-server unless a URL is given; returns (process, url)"""
+    if nats_url:
+        return None, nats_url
+    nats_bin = shutil.which("nats-server")
+    if not nats_bin:
+        raise SystemExit("nats-server not found on PATH; pass --nats-url")
+    process = subprocess.Popen([nats_bin, "-a", "127.0.0.1", "-p", str(port)])
+    return process, f"nats://127.0.0.1:{port}"
+
+def service_env(port: int, nats_url: str, files_root: str, work: Path, trace_path: Path, whitelist) -> dict:
+    """Environment wiring main.py to the local stubs on the next three ports"""
+    return os.environ | {
+        'NATS_URL': nats_url,
+        'NATS_NAME': 'transcriptron-bench',
+        'FASTAPI_PORT': str(port),
+        'TELEGRAM_TOKEN': TOKEN,
+        'TELEGRAM_API_URL': f"http://127.0.0.1:{port + 1}",
+        'TELEGRAM_FILES_ROOT': files_root,
+        'TELEGRAM_WHITELIST': ",".join(str(i) for i in whitelist),
+        'OPENAI_TOKEN': 'bench',
+        'OPENAI_BASE_URL': f"http://127.0.0.1:{port + 2}/v1",
+        'GEMINI_API_KEY': 'bench',
+        'GEMINI_BASE_URL': f"http://127.0.0.1:{port + 3}",
+        'LOG_PATH': str(work / "logs") + "/",
+        'TRACE_EXPORTER': 'jsonl',
+        'TRACE_PATH': str(trace_path),
+        'QUOTA_HOURLY_AUDIO_SECONDS': '0',
+        'QUOTA_HOURLY_REQUESTS': '0',
+        'QUOTA_DAILY_AUDIO_SECONDS': '0',
+        'QUOTA_DAILY_REQUESTS': '0',
+    }
+
+def update_for(n: int, kind: str, duration: int) -> dict:
+    message = {"message_id": n, "from": {"id": FROM_ID}, "chat": {"id": FROM_ID, "type": "private"}, "date": int(time.time())}
+    if kind == "text":
+        message["text"] = "hey, honestly the deploy broke again and I'm done chasing it, can you look? " * 3
+    else:
+        message["voice"] = {"file_id": f"job{n}", "duration": duration, "file_size": duration * 32000}
+    return {"update_id": n, "message": message}
+
+async def run(args):
+    work = Path(tempfile.mkdtemp(prefix="transcriptron-bench-"))
+    files_root = str(work / "files") + "/"
+    voice_dir = Path(files_root) / TOKEN / "voice"
+    voice_dir.mkdir(parents=True)
+    (work / "audios").mkdir()
+    (work / "logs").mkdir()
+
+    durations = [int(d) for d in args.durations.split(",")]
+    sources = {}
+    for d in durations:
+        sources[d] = work / f"source-{d}.wav"
+        write_wav(sources[d], d)
+
+    telegram = TelegramStub(TOKEN, files_root, Profile.parse(args.telegram_profile))
+    openai = OpenAIStub(Profile.parse(args.openai_profile))
+    gemini = GeminiStub(Profile.parse(args.gemini_profile))
+
+    nats_process, nats_url = start_nats(args.nats_url, args.port + 4)
+
+    trace_path = work / "traces.jsonl"
+    env = service_env(args.port, nats_url, files_root, work, trace_path, [FROM_ID])
+
+    report = {'commit': git_commit(), 'config': vars(args), 'workdir': str(work)}
+    sent = {}
+    kinds = {}
+
+    async with anyio.create_task_group() as tg:
+        stubs = [
+            await serve_stub(telegram.app(), args.port + 1, tg),
+            await serve_stub(openai.app(), args.port + 2, tg),
+            await serve_stub(gemini.app(), args.port + 3, tg),
+        ]
+
+        started = time.monotonic()
+        service = subprocess.Popen([sys.executable, str(ROOT / "main.py")], cwd=work, env=env)
+        try:
+            ready = await wait_ready(f"http://127.0.0.1:{args.port}/metrics", service)
+            report['startup_seconds'] = round(ready - started, 3)
+
+            rng = random.Random(args.seed)
+            async with httpx.AsyncClient(timeout=30) as client:
+                bench_started = time.time()
+                for n in range(1, args.jobs + 1):
+                    kind = "text" if rng.random() < args.text_ratio else "voice"
+                    duration = rng.choice(durations)
+                    if kind == "voice":
+                        os.link(sources[duration], voice_dir / f"job{n}.wav")
+                    kinds[n] = kind if kind == "text" else f"voice_{duration}s"
+                    sent[n] = time.time()
+                    await client.post(
+                        f"http://127.0.0.1:{args.port}/webhook/telegram",
+                        json=update_for(n, kind, duration)
+                    )
+                    await anyio.sleep(rng.expovariate(args.rate))
+
+            deadline = time.monotonic() + args.timeout
+            while len(telegram.replies) < len(sent) and time.monotonic() < deadline:
+                await anyio.sleep(0.5)
+            bench_finished = max((r[0][0] for r in telegram.replies.values()), default=time.time())
+
+            report['peak_rss_mb'] = peak_rss_mb(service.pid)
+        finally:
+            service.send_signal(signal.SIGTERM)
+            await anyio.to_thread.run_sync(service.wait)
+            for stub in stubs:
+                stub.should_exit = True
+            if nats_process:
+                nats_process.terminate()
+
+    latencies = defaultdict(list)
+    completed = 0
+    failed = 0
+    for n, sent_at in sent.items():
+        arrivals = telegram.replies.get(n)
+        if not arrivals:
+            continue
+        arrived_at, text = arrivals[0]
+        if any(marker in text for marker in FAILURE_MARKERS):
+            failed += 1
+            continue
+        completed += 1
+        latencies[kinds[n]].append(arrived_at - sent_at)
+        latencies['all'].append(arrived_at - sent_at)
+
+    stages = defaultdict(list)
+    if trace_path.exists():
+        with open(trace_path) as f:
+            for line in f:
+                s = json.loads(line)
+                stages[s['name']].append((s['end_ns'] - s['start_ns']) / 1e9)
+
+    report |= {
+        'jobs': {'sent': len(sent), 'completed': completed, 'failed': failed, 'lost': len(sent) - completed - failed},
+        'jobs_per_minute': round(completed / max(bench_finished - bench_started, 1e-9) * 60, 2),
+        'latency': {kind: percentiles(values) for kind, values in sorted(latencies.items())},
+        'stages': {name: percentiles(values) for name, values in sorted(stages.items())},
+        'upstream_calls': {'openai': openai.calls, 'gemini': gemini.calls},
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output)
+    print(output)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1.0, help="mean updates per second (Poisson arrivals)")
+    parser.add_argument("--durations", default="3,15,60", help="audio durations in seconds, picked uniformly")
+    parser.add_argument("--text-ratio", type=float, default=0.1)
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for stragglers")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=18000, help="service port; stubs use the next three, nats the fourth")
+    parser.add_argument("--nats-url")
+    parser.add_argument("--telegram-profile", default="latency=0.02")
+    parser.add_argument("--openai-profile", default="latency=1.0,jitter=0.3")
+    parser.add_argument("--gemini-profile", default="latency=0.8,jitter=0.2")
+    parser.add_argument("--out")
+    anyio.run(run, parser.parse_args())
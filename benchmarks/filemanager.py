@@ -0,0 +1,86 @@
+"""
+FileManager lookup cost versus namespace size: the old full-directory scan
+against the indexed, sharded layout (cold index build reported separately).
+
+    python -m benchmarks.filemanager --sizes 1000,10000,50000 --lookups 500
+"""
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+from services.filemanager import FileManager
+
+NAMESPACE = "bench.voice"
+
+def scan_lookup(directory: Path, key: str):
+    """The pre-index _find_existing: one stat per file in the namespace"""
+    for f in directory.iterdir():
+        if f.is_file() and f.stem == key:
+            return f
+    return None
+
+def populate(root: Path, size: int) -> Path:
+    directory = root.joinpath(*NAMESPACE.split("."))
+    directory.mkdir(parents=True)
+    for i in range(size):
+        (directory / f"{i}.ogg").touch()
+    return directory
+
+def per_lookup(fn, keys) -> float:
+    started = time.perf_counter()
+    for key in keys:
+        assert fn(key) is not None
+    return (time.perf_counter() - started) / len(keys) * 1e6
+
+def run(sizes, lookups: int, seed: int):
+    rng = random.Random(seed)
+    report = {}
+    for size in sizes:
+        root = Path(tempfile.mkdtemp(prefix="transcriptron-fm-"))
+        try:
+            directory = populate(root, size)
+            keys = [str(rng.randrange(size)) for _ in range(lookups)]
+            # The scan is linear, so fewer samples keep large sizes tolerable
+            scan_keys = keys[:max(10, lookups // max(1, size // 1000))]
+
+            flat = per_lookup(lambda k: scan_lookup(directory, k), scan_keys)
+
+            fm = FileManager(root)
+            started = time.perf_counter()
+            fm.migrate(NAMESPACE)
+            migrate_seconds = time.perf_counter() - started
+
+            cold = FileManager(root)
+            started = time.perf_counter()
+            cold._find_existing(NAMESPACE, keys[0])
+            index_seconds = time.perf_counter() - started
+
+            indexed = per_lookup(lambda k: cold._find_existing(NAMESPACE, k), keys)
+            # Misses fall back to the key's shard directory only
+            missing = per_lookup(lambda k: cold._find_existing(NAMESPACE, k) or True, [f"missing-{k}" for k in keys])
+
+            report[size] = {
+                'scan_us': round(flat, 2),
+                'indexed_hit_us': round(indexed, 2),
+                'indexed_miss_us': round(missing, 2),
+                'speedup': round(flat / indexed, 1),
+                'index_build_s': round(index_seconds, 4),
+                'migrate_s': round(migrate_seconds, 4),
+                'max_shard_entries': max(len(os.listdir(directory / d)) for d in os.listdir(directory)),
+            }
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(",")], args.lookups, args.seed)
@@ -0,0 +1,78 @@
+"""
+Compare per-call prompt tokens and latency with the system prompt sent inline
+versus served from a Gemini context cache, against a local stub client.
+
+    python -m benchmarks.gemini_context_cache --calls 50
+"""
+import argparse
+import json
+import os
+import time
+from types import SimpleNamespace
+from uuid import uuid4
+
+os.environ.setdefault("LOG_PATH", "/tmp/")
+
+import anyio
+from asynciolimiter import StrictLimiter
+
+from services.gemini import GeminiManager, gemini_manager as g
+
+class StubGemini:
+    """Mimics the slice of genai.Client used by GeminiManager; prefill cost scales with uncached tokens"""
+
+    def __init__(self, prefill_per_token: float):
+        self.prefill_per_token = prefill_per_token
+        self._caches = {}
+        self.models = SimpleNamespace(generate_content=self._generate_content)
+        self.aio = SimpleNamespace(
+            caches=SimpleNamespace(create=self._create_cache, update=self._update_cache)
+        )
+
+    @staticmethod
+    def _tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    async def _create_cache(self, model, config):
+        name = f"cachedContents/{uuid4().hex}"
+        self._caches[name] = self._tokens(config.system_instruction)
+        return SimpleNamespace(name=name)
+
+    async def _update_cache(self, name, config):
+        if name not in self._caches:
+            raise LookupError(name)
+
+    def _generate_content(self, model, config, contents):
+        cached = self._caches.get(config.cached_content, 0) if config.cached_content else 0
+        uncached = self._tokens(contents) + (0 if cached else self._tokens(config.system_instruction))
+        time.sleep(uncached * self.prefill_per_token)
+        return SimpleNamespace(
+            text=contents,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=uncached + cached,
+                cached_content_token_count=cached
+            )
+        )
+
+async def run(calls: int, prefill_per_token: float):
+    g.client = StubGemini(prefill_per_token)
+    g.cache_size = 0
+    GeminiManager._rate_limiter = StrictLimiter(10_000)
+
+    report = {}
+    for enabled in (False, True):
+        g.context_cache = enabled
+        for mode in g.usage.values():
+            mode.update(calls=0, prompt_tokens=0, cached_tokens=0, latency=0.0)
+        for i in range(calls):
+            await g.correct_text(f"hey, can you send me the report by friday? ({i})")
+        report['cached' if enabled else 'inline'] = g.stats()['cached' if enabled else 'inline']
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--prefill-per-token", type=float, default=0.00002)
+    args = parser.parse_args()
+    anyio.run(run, args.calls, args.prefill_per_token)
@@ -0,0 +1,131 @@
+"""
+Micro-benchmarks for the hot in-process paths: transcript chunking, Telegram
+message splitting, NATS payload encode/decode and webhook update parsing.
+
+    python -m benchmarks.micro                 # print timings
+    python -m benchmarks.micro --update        # record benchmarks/baselines.json
+    python -m benchmarks.micro --check         # exit 1 if any case regressed
+
+Each case reports the best of --repeat runs in microseconds per call. A case
+fails --check when it is slower than its baseline by more than --tolerance
+(a fraction, default 0.25). Baselines are machine-specific; refresh them with
+--update on the machine that runs the gate.
+"""
+import sys
+import json
+import random
+import timeit
+import argparse
+import platform
+from pathlib import Path
+
+from common.utils import chunk_text, split_message, encode_json, decode_json, parse_update
+
+BASELINES = Path(__file__).resolve().parent / "baselines.json"
+CHUNK_SIZE = 4000
+TELEGRAM_MAX_LENGTH = 4096
+
+WORDS = (
+    "so", "the", "deploy", "broke", "again", "and", "honestly", "I", "think", "we",
+    "should", "roll", "back", "before", "anyone", "notices", "meeting", "tomorrow",
+    "transcription", "whatever", "okay", "yeah", "um", "basically",
+)
+
+def transcript(chars: int, seed: int = 1) -> str:
+    """Speech-like text with sentence breaks and an occasional paragraph"""
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < chars:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 18))).capitalize() + "."
+        sentence += "\n\n" if rng.random() < 0.05 else " "
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)[:chars]
+
+def update(n: int, kind: str) -> bytes:
+    message = {
+        "message_id": n,
+        "from": {"id": 1000001, "is_bot": False, "first_name": "Bench", "language_code": "en"},
+        "chat": {"id": 1000001, "first_name": "Bench", "type": "private"},
+        "date": 1760000000,
+    }
+    if kind == "text":
+        message["text"] = transcript(600, n)
+    else:
+        message["voice"] = {
+            "duration": 47, "mime_type": "audio/ogg", "file_id": "AwACAgIAAxkBAAI" + "x" * 48,
+            "file_unique_id": "AgADxQ", "file_size": 187004,
+        }
+    return json.dumps({"update_id": n, "message": message}).encode()
+
+def cases():
+    """name -> (callable, calls per run)"""
+    short = transcript(3000)
+    long = transcript(120_000)
+    huge = transcript(1_000_000)
+    payload = {"message_id": 123, "from_id": 1000001, "job_id": "f" * 32, "transcription": transcript(CHUNK_SIZE)}
+    encoded = encode_json(payload)
+    voice = update(1, "voice")
+    text = update(2, "text")
+
+    return {
+        'chunk_text.short': (lambda: chunk_text(short, CHUNK_SIZE), 2000),
+        'chunk_text.120k': (lambda: chunk_text(long, CHUNK_SIZE), 200),
+        'chunk_text.1m': (lambda: chunk_text(huge, CHUNK_SIZE), 20),
+        'split_message.120k': (lambda: split_message(long, TELEGRAM_MAX_LENGTH), 200),
+        'split_message.1m': (lambda: split_message(huge, TELEGRAM_MAX_LENGTH), 20),
+        'nats.encode': (lambda: encode_json(payload), 5000),
+        'nats.decode': (lambda: decode_json(encoded), 5000),
+        'webhook.parse_voice': (lambda: parse_update(voice), 20000),
+        'webhook.parse_text': (lambda: parse_update(text), 20000),
+    }
+
+def measure(repeat: int, only=None) -> dict:
+    results = {}
+    for name, (fn, number) in cases().items():
+        if only and not any(name.startswith(o) for o in only):
+            continue
+        best = min(timeit.repeat(fn, number=number, repeat=repeat))
+        results[name] = round(best / number * 1e6, 3)
+    return results
+
+def check(results: dict, baselines: dict, tolerance: float) -> list:
+    regressions = []
+    for name, micros in results.items():
+        baseline = baselines.get(name)
+        if baseline and micros > baseline * (1 + tolerance):
+            regressions.append((name, baseline, micros))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="case name prefixes to run")
+    parser.add_argument("--update", action="store_true", help="write results as the new baselines")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = measure(args.repeat, args.only)
+    stored = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+    baselines = stored.get('cases', {})
+
+    for name, micros in results.items():
+        baseline = baselines.get(name)
+        delta = f"{(micros / baseline - 1) * 100:+.1f}%" if baseline else "new"
+        print(f"{name:<24} {micros:>12.3f} us/call  {delta}")
+
+    if args.update:
+        BASELINES.write_text(json.dumps({
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cases': baselines | results,
+        }, indent=2) + "\n")
+        print(f"Baselines written to {BASELINES}")
+
+    if args.check:
+        regressions = check(results, baselines, args.tolerance)
+        for name, baseline, micros in regressions:
+            print(f"REGRESSION {name}: {baseline} -> {micros} us/call (> {args.tolerance:.0%})")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,62 @@
+"""
+Queries per second and latency percentiles for the thread-offload and native
+async MySQL backends against a local server (MYSQL_* from the environment).
+
+    python -m benchmarks.mysql_backends --queries 5000 --concurrency 64
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("LOG_PATH", "/tmp/")
+
+import anyio
+
+from common.mysql import MySQL as db
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def bench(backend: str, queries: int, concurrency: int, query: str):
+    db.backend = backend
+    latencies = []
+    remaining = iter(range(queries))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            await db.aexecute_query(query)
+            latencies.append(time.perf_counter() - started)
+
+    # Warm the pool so connection setup is not measured
+    await db.aexecute_query(query)
+
+    started = time.perf_counter()
+    async with anyio.create_task_group() as tg:
+        for _ in range(concurrency):
+            tg.start_soon(worker)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'queries': len(latencies),
+        'qps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+async def run(queries: int, concurrency: int, query: str):
+    report = {}
+    for backend in ("thread", "aiomysql"):
+        report[backend] = await bench(backend, queries, concurrency, query)
+    await db.aclose()
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--query", default="SELECT 1 AS one")
+    args = parser.parse_args()
+    anyio.run(run, args.queries, args.concurrency, args.query)
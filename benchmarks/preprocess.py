@@ -0,0 +1,110 @@
+"""
+Silence trimming and tempo: converts sample audio through
+FFmpegManager.save_audio with the current path (no filters), trimming only
+and trimming plus tempo, and reports conversion latency and the processed
+duration Whisper would be billed for. Without --inputs, synthetic voice
+notes are generated: tone bursts separated by pauses drawn from --pauses.
+
+    python -m benchmarks.preprocess --clips 5 --seconds 120 --tempo 1.25
+    python -m benchmarks.preprocess --inputs a.ogg,b.mp3 --rtf 0.08
+
+--rtf estimates API time per processed audio second, so the end-to-end
+column is conversion plus the estimated transcription time.
+"""
+import json
+import time
+import wave
+import random
+import shutil
+import argparse
+import tempfile
+from array import array
+from pathlib import Path
+
+import anyio
+
+from benchmarks.e2e import percentiles, git_commit
+from common.config import AUDIO_PREPROCESS_CFG
+from services.ffmpeg_manager import FFmpegManager
+
+RATE = 16000
+# 400 Hz divides the sample rate, so one period can be repeated exactly
+PERIOD = array('h', [int(8000 * (1 if i < 20 else -1)) for i in range(RATE // 400)])
+
+def write_sample(path: Path, seconds: float, pauses, rng: random.Random) -> float:
+    samples = array('h')
+    total = int(seconds * RATE)
+    while len(samples) < total:
+        speech = int(rng.uniform(1.0, 4.0) * RATE)
+        samples.extend(PERIOD * (speech // len(PERIOD)))
+        pause = int(rng.uniform(*pauses) * RATE)
+        samples.extend(array('h', [rng.randint(-20, 20) for _ in range(pause)]))
+    del samples[total:]
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(samples.tobytes())
+    return total / RATE
+
+def variants(tempo: float):
+    base = AUDIO_PREPROCESS_CFG | {'trim_silence': False, 'tempo': 1.0}
+    return {
+        'current': base,
+        'trim': base | {'trim_silence': True},
+        'trim_tempo': base | {'trim_silence': True, 'tempo': tempo},
+    }
+
+async def run(args):
+    work = Path(tempfile.mkdtemp(prefix="transcriptron-preprocess-"))
+    rng = random.Random(args.seed)
+    try:
+        if args.inputs:
+            clips = [(Path(p), FFmpegManager.probe_seconds(p)) for p in args.inputs.split(",")]
+            unreadable = [str(p) for p, duration in clips if not duration]
+            if unreadable:
+                raise RuntimeError(f"Could not probe {', '.join(unreadable)}")
+        else:
+            pauses = tuple(float(s) for s in args.pauses.split(","))
+            clips = []
+            for n in range(args.clips):
+                path = work / f"sample-{n}.wav"
+                clips.append((path, write_sample(path, args.seconds, pauses, rng)))
+
+        report = {}
+        for name, cfg in variants(args.tempo).items():
+            latency, ratios, billed, total = [], [], 0.0, 0.0
+            for n, (path, duration) in enumerate(clips):
+                output = work / f"{name}-{n}.wav"
+                started = time.perf_counter()
+                if not await FFmpegManager.save_audio(str(path), str(output), duration, cfg):
+                    raise RuntimeError(f"Conversion of {path} failed for {name}")
+                latency.append(time.perf_counter() - started)
+                processed = FFmpegManager.wav_seconds(output)
+                ratios.append(duration / processed)
+                billed += processed
+                total += duration
+                output.unlink()
+            conversion = sum(latency)
+            report[name] = {
+                'conversion': percentiles(latency),
+                'audio_seconds': round(total, 1),
+                'billed_seconds': round(billed, 1),
+                'saved': round(1 - billed / total, 3),
+                'ratio': percentiles(ratios),
+                'estimated_end_to_end_s': round(conversion + billed * args.rtf, 2),
+            }
+        print(json.dumps({'commit': git_commit(), 'config': vars(args), 'variants': report}, indent=2))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inputs", help="comma-separated audio files; synthetic clips otherwise")
+    parser.add_argument("--clips", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=120)
+    parser.add_argument("--pauses", default="0.3,4.0", help="min,max pause length in seconds")
+    parser.add_argument("--tempo", type=float, default=1.25)
+    parser.add_argument("--rtf", type=float, default=0.1, help="estimated API seconds per billed audio second")
+    parser.add_argument("--seed", type=int, default=1)
+    anyio.run(run, parser.parse_args())
@@ -0,0 +1,250 @@
+"""
+Replays a webhook capture (UPDATE_CAPTURE_PATH) against the service wired to
+local Telegram/OpenAI/Gemini stubs, preserving the recorded inter-arrival
+gaps scaled by --speed, and reports per update type:
+
+  - send_lag:   how far the replay client fell behind its schedule
+  - accept:     webhook response time
+  - queueing:   handoff from the webhook to the NATS handler plus every
+                semaphore/limiter wait in the job's trace
+  - completion: first Telegram reply minus webhook send time
+
+    python -m benchmarks.replay capture.jsonl --speed 1      # real time
+    python -m benchmarks.replay capture.jsonl --speed 10     # 10x compressed
+    python -m benchmarks.replay capture.jsonl --speed 0      # as fast as possible
+
+By default main.py is started locally as in benchmarks.e2e. With --target the
+updates go to an already running staging instance instead; it must use the
+stubs started here (the required environment is printed) and --trace-path
+must point at its TRACE_PATH for queueing numbers. Media is synthesized as
+WAV of the recorded duration, so video conversion cost is understated.
+"""
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from pathlib import Path
+
+import anyio
+import httpx
+
+from benchmarks.stubs import Profile, TelegramStub, OpenAIStub, GeminiStub
+from benchmarks.e2e import (
+    ROOT, TOKEN, FAILURE_MARKERS,
+    percentiles, write_wav, peak_rss_mb, git_commit, serve_stub, wait_ready, start_nats, service_env
+)
+from benchmarks.micro import transcript
+
+MEDIA_DIRS = {'video': 'videos', 'voice': 'voice', 'audio': 'music', 'video_note': 'video_notes'}
+WAIT_SUFFIX = "_wait"
+HANDLER_SPANS = ("file.received", "text.received")
+
+def expects_reply(entry: dict) -> bool:
+    return bool(entry.get('a')) and (entry.get('k') in MEDIA_DIRS or entry.get('k') == 'text')
+
+def load_capture(path: str, include_rejected: bool, limit: int) -> list:
+    entries = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry.get('a') or include_rejected:
+                entries.append(entry)
+    entries.sort(key=lambda e: e['t'])
+    return entries[:limit] if limit else entries
+
+def update_for(n: int, entry: dict, max_duration: int) -> tuple:
+    """Rebuilds a webhook update from a capture entry; returns (update, media duration)"""
+    kind = entry.get('k')
+    message = {"message_id": n, "chat": {"id": entry.get('f', 0), "type": "private"}, "date": int(time.time())}
+    if 'f' in entry:
+        message["from"] = {"id": entry['f']}
+    duration = None
+    if kind == 'text':
+        message["text"] = transcript(max(1, entry.get('n', 1)), n)
+    elif kind in MEDIA_DIRS:
+        duration = max(1, min(int(entry.get('d') or 1), max_duration))
+        message[kind] = {"file_id": f"job{n}", "duration": entry.get('d', duration), "file_size": entry.get('s', 0)}
+        if 'm' in entry:
+            message[kind]["mime_type"] = entry['m']
+    return {"update_id": n, "message": message}, duration
+
+def trace_timings(trace_path: Path) -> dict:
+    """update_id -> queueing delay, from the job's spans"""
+    spans = defaultdict(list)
+    if not trace_path.exists():
+        return {}
+    with open(trace_path) as f:
+        for line in f:
+            s = json.loads(line)
+            spans[s['trace_id']].append(s)
+
+    timings = {}
+    for trace in spans.values():
+        update = next((s for s in trace if s['name'] == "telegram.update"), None)
+        if not update or update['attributes'].get('update_id') is None:
+            continue
+        handlers = [s['start_ns'] for s in trace if s['name'] in HANDLER_SPANS]
+        handoff = (min(handlers) - update['end_ns']) / 1e9 if handlers else 0.0
+        waits = sum(s['end_ns'] - s['start_ns'] for s in trace if s['name'].endswith(WAIT_SUFFIX)) / 1e9
+        timings[int(update['attributes']['update_id'])] = max(0.0, handoff) + waits
+    return timings
+
+async def run(args):
+    entries = load_capture(args.capture, args.include_rejected, args.limit)
+    if not entries:
+        raise SystemExit("Capture has no replayable updates")
+
+    work = Path(tempfile.mkdtemp(prefix="transcriptron-replay-"))
+    files_root = str(work / "files") + "/"
+    for directory in MEDIA_DIRS.values():
+        (Path(files_root) / TOKEN / directory).mkdir(parents=True)
+    (work / "audios").mkdir()
+    (work / "logs").mkdir()
+
+    updates = {}
+    kinds = {}
+    sources = {}
+    for n, entry in enumerate(entries, start=1):
+        update, duration = update_for(n, entry, args.max_duration)
+        updates[n] = update
+        kinds[n] = entry.get('k') or "other"
+        if duration:
+            if duration not in sources:
+                sources[duration] = work / f"source-{duration}.wav"
+                write_wav(sources[duration], duration)
+            # getFile answers with the voice path; the webhook resolves the basename per kind
+            directory = Path(files_root) / TOKEN / MEDIA_DIRS[entry['k']]
+            (directory / f"job{n}.wav").hardlink_to(sources[duration])
+
+    whitelist = sorted({e['f'] for e in entries if e.get('a') and 'f' in e})
+    telegram = TelegramStub(TOKEN, files_root, Profile.parse(args.telegram_profile))
+    openai = OpenAIStub(Profile.parse(args.openai_profile))
+    gemini = GeminiStub(Profile.parse(args.gemini_profile))
+
+    trace_path = Path(args.trace_path) if args.trace_path else work / "traces.jsonl"
+    target = args.target or f"http://127.0.0.1:{args.port}"
+    env = service_env(args.port, args.nats_url or "", files_root, work, trace_path, whitelist)
+
+    report = {'commit': git_commit(), 'config': vars(args), 'workdir': str(work), 'updates': len(entries)}
+    sent = {}
+    lag = {}
+    accept = {}
+
+    async with anyio.create_task_group() as tg:
+        stubs = [
+            await serve_stub(telegram.app(), args.port + 1, tg),
+            await serve_stub(openai.app(), args.port + 2, tg),
+            await serve_stub(gemini.app(), args.port + 3, tg),
+        ]
+
+        service = None
+        nats_process = None
+        try:
+            if args.target:
+                stub_env = {k: env[k] for k in (
+                    'TELEGRAM_TOKEN', 'TELEGRAM_API_URL', 'TELEGRAM_FILES_ROOT', 'TELEGRAM_WHITELIST',
+                    'OPENAI_BASE_URL', 'GEMINI_BASE_URL'
+                )}
+                print(json.dumps({'staging_env': stub_env}, indent=2), file=sys.stderr)
+            else:
+                nats_process, env['NATS_URL'] = start_nats(args.nats_url, args.port + 4)
+                service = subprocess.Popen([sys.executable, str(ROOT / "main.py")], cwd=work, env=env)
+                await wait_ready(f"{target}/metrics", service)
+
+            async def post(client, n):
+                started = time.time()
+                sent[n] = started
+                try:
+                    await client.post(f"{target}/webhook/telegram", json=updates[n])
+                finally:
+                    accept[n] = time.time() - started
+
+            first = entries[0]['t']
+            async with httpx.AsyncClient(timeout=30) as client, anyio.create_task_group() as senders:
+                origin = time.monotonic()
+                for n, entry in enumerate(entries, start=1):
+                    due = (entry['t'] - first) / args.speed if args.speed > 0 else 0.0
+                    delay = origin + due - time.monotonic()
+                    if delay > 0:
+                        await anyio.sleep(delay)
+                    lag[n] = max(0.0, time.monotonic() - origin - due)
+                    # Concurrent sends so a slow webhook doesn't distort the arrival pattern
+                    senders.start_soon(post, client, n)
+
+            deadline = time.monotonic() + args.timeout
+            expected = sum(1 for e in entries if expects_reply(e))
+            while len(telegram.replies) < expected and time.monotonic() < deadline:
+                await anyio.sleep(0.5)
+
+            if service:
+                report['peak_rss_mb'] = peak_rss_mb(service.pid)
+        finally:
+            if service:
+                service.send_signal(signal.SIGTERM)
+                await anyio.to_thread.run_sync(service.wait)
+            for stub in stubs:
+                stub.should_exit = True
+            if nats_process:
+                nats_process.terminate()
+
+    queueing = trace_timings(trace_path)
+    by_kind = defaultdict(lambda: defaultdict(list))
+    outcomes = defaultdict(lambda: defaultdict(int))
+    for n in sent:
+        kind = kinds[n]
+        by_kind[kind]['send_lag'].append(lag[n])
+        by_kind[kind]['accept'].append(accept.get(n, 0.0))
+        if n in queueing:
+            by_kind[kind]['queueing'].append(queueing[n])
+        arrivals = telegram.replies.get(n)
+        if not entries[n - 1].get('a'):
+            outcomes[kind]['rejected'] += 1
+        elif not expects_reply(entries[n - 1]):
+            outcomes[kind]['ignored'] += 1
+        elif not arrivals:
+            outcomes[kind]['lost'] += 1
+        elif any(marker in arrivals[0][1] for marker in FAILURE_MARKERS):
+            outcomes[kind]['failed'] += 1
+        else:
+            outcomes[kind]['completed'] += 1
+            by_kind[kind]['completion'].append(arrivals[0][0] - sent[n])
+
+    report |= {
+        'captured_span_seconds': round(entries[-1]['t'] - entries[0]['t'], 3),
+        'outcomes': {kind: dict(counts) for kind, counts in sorted(outcomes.items())},
+        'latency': {
+            kind: {metric: percentiles(values) for metric, values in metrics.items()}
+            for kind, metrics in sorted(by_kind.items())
+        },
+        'upstream_calls': {'openai': openai.calls, 'gemini': gemini.calls},
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output)
+    print(output)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("capture", help="JSONL written by UPDATE_CAPTURE_PATH")
+    parser.add_argument("--speed", type=float, default=1.0, help="time compression; 0 sends as fast as possible")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N updates")
+    parser.add_argument("--include-rejected", action="store_true", help="also send updates that were not whitelisted")
+    parser.add_argument("--max-duration", type=int, default=600, help="cap synthesized media length in seconds")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for stragglers")
+    parser.add_argument("--port", type=int, default=18000, help="service port; stubs use the next three, nats the fourth")
+    parser.add_argument("--target", help="base URL of a running staging instance instead of a local main.py")
+    parser.add_argument("--trace-path", help="TRACE_PATH of the --target instance")
+    parser.add_argument("--nats-url")
+    parser.add_argument("--telegram-profile", default="latency=0.02")
+    parser.add_argument("--openai-profile", default="latency=1.0,jitter=0.3")
+    parser.add_argument("--gemini-profile", default="latency=0.8,jitter=0.2")
+    parser.add_argument("--out")
+    anyio.run(run, parser.parse_args())
@@ -0,0 +1,112 @@
+"""
+Cold-start budget check: starts main.py --runs times against local stubs,
+posts a text update as soon as the port accepts connections and measures
+time-to-first-webhook-accepted (process spawn to the first 200) and to the
+first reply, which includes lazy client initialization. The service runs
+with STARTUP_PROFILE=1, so its per-module import report is included.
+
+    python -m benchmarks.startup --runs 5 --budget 5
+
+Exits 1 when the slowest run's time-to-first-webhook exceeds --budget.
+"""
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import anyio
+import httpx
+
+from benchmarks.stubs import Profile, TelegramStub, OpenAIStub, GeminiStub
+from benchmarks.e2e import ROOT, TOKEN, FROM_ID, percentiles, git_commit, serve_stub, start_nats, service_env, update_for
+
+async def first_accept(url: str, update: dict, process: subprocess.Popen, timeout: float) -> float:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=5) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Service exited with {process.returncode} before accepting a webhook")
+            try:
+                if (await client.post(url, json=update)).status_code == 200:
+                    return time.monotonic()
+            except httpx.RequestError:
+                pass
+            await anyio.sleep(0.01)
+    raise TimeoutError("Service did not accept a webhook")
+
+async def run(args):
+    work = Path(tempfile.mkdtemp(prefix="transcriptron-startup-"))
+    files_root = str(work / "files") + "/"
+    (work / "audios").mkdir()
+    (work / "logs").mkdir()
+    profiles = work / "profiles"
+
+    telegram = TelegramStub(TOKEN, files_root, Profile())
+    nats_process, nats_url = start_nats(args.nats_url, args.port + 4)
+    env = service_env(args.port, nats_url, files_root, work, work / "traces.jsonl", [FROM_ID]) | {
+        'STARTUP_PROFILE': '1',
+        'STARTUP_BUDGET': str(args.budget),
+        'PROFILE_DIR': str(profiles) + "/",
+    }
+
+    accepted = []
+    replied = []
+    reports = []
+    async with anyio.create_task_group() as tg:
+        stubs = [
+            await serve_stub(telegram.app(), args.port + 1, tg),
+            await serve_stub(OpenAIStub().app(), args.port + 2, tg),
+            await serve_stub(GeminiStub().app(), args.port + 3, tg),
+        ]
+        try:
+            for n in range(1, args.runs + 1):
+                update = update_for(n, "text", 0)
+                started = time.monotonic()
+                service = subprocess.Popen([sys.executable, str(ROOT / "main.py")], cwd=work, env=env)
+                try:
+                    accepted.append(await first_accept(
+                        f"http://127.0.0.1:{args.port}/webhook/telegram", update, service, args.timeout
+                    ) - started)
+                    deadline = time.monotonic() + args.timeout
+                    while n not in telegram.replies and time.monotonic() < deadline:
+                        await anyio.sleep(0.01)
+                    if n in telegram.replies:
+                        replied.append(time.monotonic() - started)
+                finally:
+                    service.send_signal(signal.SIGTERM)
+                    await anyio.to_thread.run_sync(service.wait)
+
+                report = profiles / f"startup-{service.pid}.json"
+                if report.exists():
+                    reports.append(json.loads(report.read_text()))
+        finally:
+            for stub in stubs:
+                stub.should_exit = True
+            if nats_process:
+                nats_process.terminate()
+
+    slowest = max(accepted) if accepted else None
+    result = {
+        'commit': git_commit(),
+        'config': vars(args),
+        'first_webhook_accepted': percentiles(accepted) | {'max': round(slowest, 4) if accepted else None},
+        'first_reply': percentiles(replied),
+        'within_budget': slowest is not None and slowest <= args.budget,
+        # The last run's service-side view: milestones, lazy inits and slowest imports
+        'service': reports[-1] if reports else None,
+    }
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result['within_budget'] else 1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=5.0, help="seconds from spawn to the first accepted webhook")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--port", type=int, default=18100, help="service port; stubs use the next three, nats the fourth")
+    parser.add_argument("--nats-url")
+    anyio.run(run, parser.parse_args())
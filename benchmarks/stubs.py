@@ -0,0 +1,162 @@
+"""
+Local stand-ins for the Telegram Bot API, OpenAI and Gemini used by the
+benchmark harnesses. Each stub has a latency/error profile:
+
+    Profile.parse("latency=0.8,jitter=0.3,errors=0.01,throttle=0.02")
+"""
+import json
+import time
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import anyio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+@dataclass
+class Profile:
+    latency: float = 0.0
+    jitter: float = 0.0
+    errors: float = 0.0
+    throttle: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Profile":
+        values = {}
+        for part in filter(None, spec.split(",")):
+            key, value = part.split("=")
+            values[key.strip()] = float(value)
+        return cls(**values)
+
+    async def apply(self) -> Optional[JSONResponse]:
+        """Sleeps for the profile's latency and returns an error response when one is due"""
+        await anyio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        roll = random.random()
+        if roll < self.throttle:
+            return JSONResponse({"error": {"message": "stub throttled", "code": 429}}, status_code=429, headers={"Retry-After": "1"})
+        if roll < self.throttle + self.errors:
+            return JSONResponse({"error": {"message": "stub failure", "code": 500}}, status_code=500)
+        return None
+
+@dataclass
+class TelegramStub:
+    token: str
+    files_root: str
+    profile: Profile = field(default_factory=Profile)
+    # reply-to message_id -> (arrival time, text) of sendMessage calls answering it
+    replies: Dict[int, List[Tuple[float, str]]] = field(default_factory=dict)
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/bot{token}/{method}")
+        async def bot_method(token: str, method: str, request: Request):
+            error = await self.profile.apply()
+            if error:
+                return JSONResponse({"ok": False, "error_code": error.status_code, "description": "stub"}, status_code=error.status_code)
+
+            params = {k: v[0] for k, v in parse_qs((await request.body()).decode()).items()}
+
+            if method == "getFile":
+                file_id = params.get("file_id", "")
+                return {"ok": True, "result": {
+                    "file_id": file_id,
+                    "file_path": f"{self.files_root}{self.token}/voice/{file_id}.wav"
+                }}
+
+            if method == "sendMessage":
+                reply = json.loads(params.get("reply_parameters") or "{}")
+                message_id = reply.get("message_id")
+                if message_id is not None:
+                    self.replies.setdefault(int(message_id), []).append((time.time(), params.get("text", "")))
+                return {"ok": True, "result": {"message_id": random.randint(1, 1 << 30)}}
+
+            return {"ok": True, "result": True}
+
+        return app
+
+@dataclass
+class OpenAIStub:
+    profile: Profile = field(default_factory=Profile)
+    calls: int = 0
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/audio/transcriptions")
+        async def transcriptions(request: Request):
+            body = await request.body()
+            self.calls += 1
+            error = await self.profile.apply()
+            if error:
+                return error
+            # Output grows with the upload so chunking and sending see realistic sizes
+            words = max(1, len(body) // 8000)
+            return {"text": " ".join(["lorem"] * words)}
+
+        @app.post("/v1/chat/completions")
+        async def chat(request: Request):
+            body = await request.json()
+            self.calls += 1
+            error = await self.profile.apply()
+            if error:
+                return error
+            content = body["messages"][-1]["content"]
+            return {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }
+
+        return app
+
+@dataclass
+class GeminiStub:
+    profile: Profile = field(default_factory=Profile)
+    calls: int = 0
+
+    @staticmethod
+    def _response(text: str) -> dict:
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": max(1, len(text) // 4), "candidatesTokenCount": max(1, len(text) // 4)},
+        }
+
+    @staticmethod
+    def _text(body: dict) -> str:
+        return "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+
+    def app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/{version}/models/{model_action}")
+        async def generate(version: str, model_action: str, request: Request):
+            body = await request.json()
+            self.calls += 1
+            error = await self.profile.apply()
+            if error:
+                return error
+            text = self._text(body)
+
+            if model_action.endswith(":streamGenerateContent"):
+                async def chunks():
+                    for word in text.split(" "):
+                        yield f"data: {json.dumps(self._response(word + ' '))}\r\n\r\n"
+                return StreamingResponse(chunks(), media_type="text/event-stream")
+
+            return self._response(text)
+
+        @app.post("/{version}/cachedContents")
+        async def create_cache(version: str):
+            return {"name": f"cachedContents/stub-{random.randint(1, 1 << 30)}", "model": "stub"}
+
+        @app.patch("/{version}/cachedContents/{name}")
+        async def update_cache(version: str, name: str):
+            return {"name": f"cachedContents/{name}", "model": "stub"}
+
+        return app
@@ -17,17 +17,63 @@ MYSQL_CFG = {
     'pool_size': 32,
 }
 
+# "thread" runs mysql.connector in worker threads, "aiomysql" uses a native async pool
+MYSQL_BACKEND = os.environ.get("MYSQL_BACKEND", "thread")
+
+MYSQL_WRITE_BEHIND_CFG = {
+    'max_batch': int(os.environ.get("MYSQL_WB_MAX_BATCH", 500)),
+    'flush_interval': float(os.environ.get("MYSQL_WB_FLUSH_INTERVAL", 1.0)),
+    'max_rows': int(os.environ.get("MYSQL_WB_MAX_ROWS", 10000)),
+    'max_failed': int(os.environ.get("MYSQL_WB_MAX_FAILED", 10000)),
+    'retry_interval': float(os.environ.get("MYSQL_WB_RETRY_INTERVAL", 30)),
+    # Failed rows beyond max_failed, and any left at shutdown, are appended here and replayed at startup
+    'spill_path': os.environ.get("MYSQL_WB_SPILL_PATH", (os.environ.get("LOG_PATH") or "") + "write_behind_spill.jsonl"),
+}
+
 OPENAI_TOKEN = os.environ.get("OPENAI_TOKEN")
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL")
 
+# Transcription backends in order of preference: openai, local, stub. A clip goes to the
+# first backend whose limits admit it; the last one takes whatever the others turn down
+TRANSCRIBE_BACKENDS = [b.strip() for b in os.environ.get("TRANSCRIBE_BACKENDS", "openai").split(",") if b.strip()]
+TRANSCRIBE_LOCAL_MAX_SECONDS = float(os.environ.get("TRANSCRIBE_LOCAL_MAX_SECONDS", 30))
+TRANSCRIBE_LOCAL_MAX_QUEUE = int(os.environ.get("TRANSCRIBE_LOCAL_MAX_QUEUE", 2))
+
+# The local backend needs faster-whisper and a CTranslate2 model directory
+LOCAL_WHISPER_CFG = {
+    'model_path': os.environ.get("LOCAL_WHISPER_MODEL", ""),
+    'compute_type': os.environ.get("LOCAL_WHISPER_COMPUTE_TYPE", "int8"),
+    'cpu_threads': int(os.environ.get("LOCAL_WHISPER_THREADS", 0)),
+    'workers': int(os.environ.get("LOCAL_WHISPER_WORKERS", 1)),
+    'beam_size': int(os.environ.get("LOCAL_WHISPER_BEAM_SIZE", 1)),
+}
+
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL")
+GEMINI_CONTEXT_CACHE = os.environ.get("GEMINI_CONTEXT_CACHE", "1") == "1"
+GEMINI_CONTEXT_CACHE_TTL = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", 3600))
 
 REWRITE_SECRET = os.environ.get("REWRITE_SECRET")
+# Unset disables the transcript archive API; it never shares the rewrite secret
+TRANSCRIPTS_SECRET = os.environ.get("TRANSCRIPTS_SECRET") or None
+REWRITE_CACHE_SIZE = int(os.environ.get("REWRITE_CACHE_SIZE", 1024))
+REWRITE_BATCH_MAX = int(os.environ.get("REWRITE_BATCH_MAX", 50))
+REWRITE_BATCH_CONCURRENCY = int(os.environ.get("REWRITE_BATCH_CONCURRENCY", 4))
+REWRITE_QUEUE_MAX = int(os.environ.get("REWRITE_QUEUE_MAX", 100))
+REWRITE_JOB_TTL = int(os.environ.get("REWRITE_JOB_TTL", 3600))
+# Queued jobs not finished by then are failed, freeing their queue slot
+REWRITE_JOB_TIMEOUT = int(os.environ.get("REWRITE_JOB_TIMEOUT", 900))
+# Hosts async callbacks may be sent to; empty allows any host with a public address
+REWRITE_CALLBACK_HOSTS = [h.strip().lower() for h in os.environ.get("REWRITE_CALLBACK_HOSTS", "").split(",") if h.strip()]
+REWRITE_PROVIDERS = os.environ.get("REWRITE_PROVIDERS", "gemini,openai").split(",")
+REWRITE_SPILL_AFTER = float(os.environ.get("REWRITE_SPILL_AFTER", 20))
 
 TELEGRAM_SECRET = os.environ.get("TELEGRAM_SECRET")
 TELEGRAM_TOKEN = os.environ.get("TELEGRAM_TOKEN")
 
-DOCKER_MOUNTPOINT = "/var/lib/telegram-bot-api/"
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL", "http://127.0.0.1:8081")
+
+DOCKER_MOUNTPOINT = os.environ.get("TELEGRAM_FILES_ROOT", "/var/lib/telegram-bot-api/")
 
 DOCKER_VIDEO_MOUNTPOINT = f'{DOCKER_MOUNTPOINT}{TELEGRAM_TOKEN}/videos/'
 DOCKER_AUDIO_MOUNTPOINT = f'{DOCKER_MOUNTPOINT}{TELEGRAM_TOKEN}/music/'
@@ -35,6 +81,8 @@ DOCKER_VIDEONOTE_MOUNTPOINT = f'{DOCKER_MOUNTPOINT}{TELEGRAM_TOKEN}/video_notes/
 DOCKER_VOICE_MOUNTPOINT = f'{DOCKER_MOUNTPOINT}{TELEGRAM_TOKEN}/voice/'
 
 TELEGRAM_WHITELIST = [
+    int(i) for i in os.environ["TELEGRAM_WHITELIST"].split(",")
+] if os.environ.get("TELEGRAM_WHITELIST") else [
     733014989,
     1787004354,
     6273660879,
@@ -47,6 +95,30 @@ TELEGRAM_WHITELIST = [
     5077427032,
 ]
 
+# 0 disables a limit; "requests" counts Whisper and Gemini calls together
+USAGE_QUOTAS = {
+    'hourly': {
+        'audio_seconds': float(os.environ.get("QUOTA_HOURLY_AUDIO_SECONDS", 3600)),
+        'requests': int(os.environ.get("QUOTA_HOURLY_REQUESTS", 120)),
+    },
+    'daily': {
+        'audio_seconds': float(os.environ.get("QUOTA_DAILY_AUDIO_SECONDS", 4 * 3600)),
+        'requests': int(os.environ.get("QUOTA_DAILY_REQUESTS", 600)),
+    },
+}
+
+# Subscribers join this queue group so each message goes to one worker process
+NATS_QUEUE = os.environ.get("NATS_QUEUE", "transcriptron")
+
+# SERVICE_ROLE: ingest, worker, scheduler, all (one process) or supervisor (spawns the others)
+SERVICE_ROLE = os.environ.get("SERVICE_ROLE", "all")
+SERVICE_WORKERS = int(os.environ.get("SERVICE_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+# Processes calling Telegram, Gemini and OpenAI; the supervisor sets it for its children so
+# each one takes an equal share of the upstream rate limits instead of the whole quota
+SERVICE_PROCESSES = max(1, int(os.environ.get("SERVICE_PROCESSES", 1)))
+# Names this process in diagnostics subjects; the supervisor sets ingest, scheduler, worker-<n>
+SERVICE_INSTANCE = os.environ.get("SERVICE_INSTANCE", SERVICE_ROLE)
+
 NATS_CFG = {
     'servers': os.environ.get("NATS_URL"),
     'name': os.environ.get("NATS_NAME"),
@@ -59,12 +131,63 @@ FASTAPI_CFG = {
     'port': int(os.environ.get("FASTAPI_PORT", 8000))
 }
 
+PROFILE_DIR = os.environ.get("PROFILE_DIR", (os.environ.get("LOG_PATH") or "") + "profiles/")
+
+LOOP_MONITOR_CFG = {
+    'enabled': os.environ.get("LOOP_MONITOR", "1") == "1",
+    'interval': float(os.environ.get("LOOP_MONITOR_INTERVAL", 0.25)),
+    'threshold': float(os.environ.get("LOOP_MONITOR_THRESHOLD", 0.5)),
+}
+
+# Temp audio for conversions. Point SCRATCH_ROOT at a tmpfs (e.g. /dev/shm/transcriptron/)
+# to keep it off the disk; the quota is per process, min_free applies to the filesystem
+SCRATCH_CFG = {
+    'root': os.environ.get("SCRATCH_ROOT", "audios/"),
+    'quota_bytes': int(float(os.environ.get("SCRATCH_QUOTA_MB", 1024)) * 1024 * 1024),
+    'min_free_bytes': int(float(os.environ.get("SCRATCH_MIN_FREE_MB", 256)) * 1024 * 1024),
+    'default_estimate': 32 * 1024 * 1024,
+    'wait_timeout': float(os.environ.get("SCRATCH_WAIT_TIMEOUT", 300)),
+    'orphan_age': int(os.environ.get("SCRATCH_ORPHAN_AGE", 3600)),
+}
+
+# Optional conversion filters that shorten what Whisper is billed for. Pauses longer than
+# min_silence below threshold_db are cut down to keep_silence; tempo 1.0 disables atempo
+AUDIO_PREPROCESS_CFG = {
+    'trim_silence': os.environ.get("AUDIO_TRIM_SILENCE", "0") == "1",
+    'threshold_db': float(os.environ.get("AUDIO_SILENCE_THRESHOLD_DB", -40)),
+    'min_silence': float(os.environ.get("AUDIO_MIN_SILENCE", 0.75)),
+    'keep_silence': float(os.environ.get("AUDIO_KEEP_SILENCE", 0.25)),
+    'tempo': float(os.environ.get("AUDIO_TEMPO", 1.0)),
+}
+
+# UPDATE_CAPTURE_PATH: "" disables capture; otherwise sanitized webhook updates are appended as JSONL
+UPDATE_CAPTURE_CFG = {
+    'path': os.environ.get("UPDATE_CAPTURE_PATH", ""),
+    'salt': os.environ.get("UPDATE_CAPTURE_SALT") or TELEGRAM_SECRET or "",
+    'max_buffer': 10000,
+    'flush_interval': 1.0,
+}
+
+# TRACE_EXPORTER: "" disables spans, "jsonl" appends to TRACE_PATH, "otlp" posts to an OTLP/HTTP collector
+TRACE_CFG = {
+    'exporter': os.environ.get("TRACE_EXPORTER", ""),
+    'path': os.environ.get("TRACE_PATH", (os.environ.get("LOG_PATH") or "") + "traces.jsonl"),
+    'endpoint': os.environ.get("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318"),
+    'max_buffer': 10000,
+    'flush_interval': 1.0,
+}
+
 LOGGING_CFG = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'trace': {
+            '()': 'common.tracing.TraceContextFilter',
+        },
+    },
     'formatters': {
         'verbose': {
-            'format': '%(levelname)s %(asctime)s %(name)s %(process)d %(thread)d %(message)s',
+            'format': '%(levelname)s %(asctime)s %(name)s %(process)d %(thread)d [%(trace_id)s] %(message)s',
         },
         'simple': {
             'format': '%(levelname)s %(message)s',
@@ -75,12 +198,14 @@ LOGGING_CFG = {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
+            'filters': ['trace'],
         },
         'main_file': {
             'level': 'INFO',
             'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.environ.get("LOG_PATH")+"main.log",
             'formatter': 'verbose',
+            'filters': ['trace'],
             'encoding': 'utf-8',
             'maxBytes': 10*1024*1024,
             'backupCount': 5,
@@ -90,6 +215,7 @@ LOGGING_CFG = {
             'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.environ.get("LOG_PATH")+"mysql.log",
             'formatter': 'verbose',
+            'filters': ['trace'],
             'encoding': 'utf-8',
             'maxBytes': 10*1024*1024,
             'backupCount': 5,
@@ -99,6 +225,7 @@ LOGGING_CFG = {
             'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.environ.get("LOG_PATH")+"nats.log",
             'formatter': 'verbose',
+            'filters': ['trace'],
             'encoding': 'utf-8',
             'maxBytes': 10*1024*1024,
             'backupCount': 5,
@@ -108,6 +235,7 @@ LOGGING_CFG = {
             'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.environ.get("LOG_PATH")+"fastapi.log",
             'formatter': 'verbose',
+            'filters': ['trace'],
             'encoding': 'utf-8',
             'maxBytes': 10*1024*1024,
             'backupCount': 5,
@@ -117,6 +245,7 @@ LOGGING_CFG = {
             'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.environ.get("LOG_PATH")+"scheduler.log",
             'formatter': 'verbose',
+            'filters': ['trace'],
             'encoding': 'utf-8',
             'maxBytes': 10*1024*1024,
             'backupCount': 5,
@@ -126,6 +255,7 @@ LOGGING_CFG = {
             'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.environ.get("LOG_PATH")+"filemanager.log",
             'formatter': 'verbose',
+            'filters': ['trace'],
             'encoding': 'utf-8',
             'maxBytes': 10*1024*1024,
             'backupCount': 5,
@@ -165,4 +295,13 @@ LOGGING_CFG = {
     },
 }
 
+# Handlers above are moved behind a bounded queue drained by one writer thread
+LOGGING_QUEUE_CFG = {
+    'maxsize': int(os.environ.get("LOG_QUEUE_SIZE", 10000)),
+    'max_message': int(os.environ.get("LOG_MAX_MESSAGE", 4000)),
+}
+
 logging.config.dictConfig(LOGGING_CFG)
+
+from common import logging_queue
+logging_queue.install(list(LOGGING_CFG['loggers']), **LOGGING_QUEUE_CFG)
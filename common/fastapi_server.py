@@ -1,6 +1,8 @@
 import logging
 
 from common.config import FASTAPI_CFG
+from common.metrics import http_request_seconds
+from common import startup
 
 import uvicorn
 from anyio import Event
@@ -9,6 +11,37 @@ from uvicorn import Config
 from fastapi import FastAPI
 
 import anyio
+import time
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: times each request without buffering the response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Route template keeps label cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            http_request_seconds.observe(
+                time.perf_counter() - started,
+                method=scope["method"], path=path, status=status
+            )
 
 api = FastAPI(
     title="API",
@@ -18,6 +51,7 @@ api = FastAPI(
     version=None,
     description=None
 )
+api.add_middleware(MetricsMiddleware)
 
 logger = logging.getLogger("fastapi")
 
@@ -33,6 +67,7 @@ class FastAPIServer:
             host=self.host,
             port=self.port,
             log_level="info",
+            log_config=None,  # Let uvicorn loggers propagate into the queued root handlers
             loop="none"  # Important: tells uvicorn to use existing loop
         )
         
@@ -41,6 +76,9 @@ class FastAPIServer:
         try:
             # Start the server
             task_group.start_soon(self.server.serve)
+            while not self.server.started and not shutdown_event.is_set():
+                await anyio.sleep(0.05)
+            startup.mark("http_listening")
             logger.info(f"FastAPI server started on {self.host}:{self.port}")
             
             # Wait for shutdown signal
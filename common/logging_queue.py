@@ -0,0 +1,114 @@
+import copy
+import queue
+import atexit
+import logging
+import logging.handlers
+from typing import Dict, List, Optional
+
+from common.metrics import registry
+
+log_dropped_total = registry.counter(
+    "transcriptron_log_dropped_total", "Log records dropped because the log queue was full", ("level",)
+)
+log_truncated_total = registry.counter(
+    "transcriptron_log_truncated_total", "Log messages truncated to the size limit"
+)
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a bounded queue without ever blocking the caller. When
+    the queue is full, records below ERROR are dropped; ERROR and above evict
+    the oldest queued record so failures still reach the files.
+    """
+
+    def __init__(self, log_queue: queue.Queue, target: str, max_message: int):
+        super().__init__(log_queue)
+        self.target = target
+        self.max_message = max_message
+
+    def prepare(self, record):
+        msg = record.getMessage()
+        if self.max_message and len(msg) > self.max_message:
+            msg = f"{msg[:self.max_message]}... [{len(msg) - self.max_message} chars truncated]"
+            log_truncated_total.inc()
+
+        record = copy.copy(record)
+        record.message = msg
+        record.msg = msg
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.log_target = self.target
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return
+        except queue.Full:
+            pass
+
+        if record.levelno >= logging.ERROR:
+            try:
+                self.queue.get_nowait()
+                self.queue.put_nowait(record)
+                log_dropped_total.inc(level="evicted")
+                return
+            except (queue.Empty, queue.Full):
+                pass
+
+        log_dropped_total.inc(level=record.levelname)
+
+class DispatchingQueueListener(logging.handlers.QueueListener):
+    """One writer thread that routes each record to the handlers of the logger it came from"""
+
+    def __init__(self, log_queue: queue.Queue, targets: Dict[str, List[logging.Handler]]):
+        super().__init__(log_queue, respect_handler_level=True)
+        self.targets = targets
+
+    def enqueue_sentinel(self):
+        # Shutdown may wait for the writer to make room; records never do
+        self.queue.put(self._sentinel)
+
+    def handle(self, record):
+        record = self.prepare(record)
+        for handler in self.targets.get(getattr(record, 'log_target', ''), ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+_listener: Optional[DispatchingQueueListener] = None
+
+def install(logger_names: List[str], maxsize: int = 10000, max_message: int = 4000):
+    """Moves the handlers configured on each logger behind a shared bounded queue"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize)
+    targets: Dict[str, List[logging.Handler]] = {}
+
+    for name in logger_names:
+        lg = logging.getLogger(name or None)
+        handlers = list(lg.handlers)
+        if not handlers:
+            continue
+        targets[name] = handlers
+
+        queue_handler = DroppingQueueHandler(log_queue, name, max_message)
+        # Context-dependent filters (trace id) must run in the logging thread
+        for handler in handlers:
+            for f in handler.filters:
+                if f not in queue_handler.filters:
+                    queue_handler.addFilter(f)
+        lg.handlers = [queue_handler]
+
+    _listener = DispatchingQueueListener(log_queue, targets)
+    _listener.start()
+    atexit.register(stop)
+
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,95 @@
+import sys
+import time
+import logging
+import threading
+import traceback
+from typing import Optional
+
+from common.config import LOOP_MONITOR_CFG
+from common.metrics import registry
+
+import anyio
+from anyio import Event
+
+logger = logging.getLogger("loop")
+
+loop_lag_seconds = registry.histogram(
+    "transcriptron_loop_lag_seconds", "Event loop scheduling lag",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+loop_stalls_total = registry.counter(
+    "transcriptron_loop_stalls_total", "Event loop stalls longer than the threshold"
+)
+loop_lag_max = registry.gauge(
+    "transcriptron_loop_lag_max_seconds", "Largest lag seen since the last scrape window"
+)
+
+class LoopMonitor:
+    """
+    Measures how late a periodic sleep wakes up on the event loop. A watchdog
+    thread notices when the loop stops ticking and snapshots the loop thread's
+    stack while the offending callback is still running.
+    """
+
+    def __init__(self, interval: float, threshold: float, enabled: bool = True):
+        self.interval = interval
+        self.threshold = threshold
+        self.enabled = enabled
+        self.last_stall: Optional[dict] = None
+        self._heartbeat = time.perf_counter()
+        self._loop_thread: Optional[int] = None
+        self._stopped = threading.Event()
+        self._reported = False
+
+    async def serve(self, shutdown_event: Event):
+        if not self.enabled:
+            return
+
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stopped.clear()
+        watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        watchdog.start()
+        logger.info(f"Loop monitor started (interval {self.interval}s, threshold {self.threshold}s)")
+
+        try:
+            window_max = 0.0
+            window_started = time.perf_counter()
+            while not shutdown_event.is_set():
+                before = time.perf_counter()
+                await anyio.sleep(self.interval)
+                now = time.perf_counter()
+                self._heartbeat = now
+
+                lag = max(0.0, now - before - self.interval)
+                loop_lag_seconds.observe(lag)
+                window_max = max(window_max, lag)
+                if now - window_started >= 60:
+                    loop_lag_max.set(window_max)
+                    window_max = 0.0
+                    window_started = now
+        finally:
+            self._stopped.set()
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 2):
+            stalled = time.perf_counter() - self._heartbeat - self.interval
+            if stalled < self.threshold:
+                self._reported = False
+                continue
+            if self._reported:
+                continue
+
+            # Report each stall once, with the stack that is blocking the loop
+            self._reported = True
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>"
+            self.last_stall = {
+                'at': time.time(),
+                'stalled_for': round(stalled, 3),
+                'stack': stack,
+            }
+            loop_stalls_total.inc()
+            logger.warning(f"Event loop blocked for {stalled:.3f}s, loop thread stack:\n{stack}")
+
+loop_monitor = LoopMonitor(**LOOP_MONITOR_CFG)
@@ -0,0 +1,198 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in self._values.items()]
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels):
+        """Value is read from fn at scrape time, so the hot path pays nothing"""
+        self._functions[self._key(labels)] = fn
+
+    def values(self) -> Dict[Tuple, float]:
+        values = dict(self._values)
+        for key, fn in self._functions.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return values
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, k)} {v}" for k, v in self.values().items()]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._values.get(key)
+        if counts is None:
+            counts = self._values[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, counts in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            cumulative += counts[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {counts[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, cls, name, documentation, labelnames=(), **kwargs):
+        if name not in self._metrics:
+            self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        return self._metrics[name]
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Optional[Sequence[float]] = None
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets or DEFAULT_BUCKETS)
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+registry = Registry()
+
+http_request_seconds = registry.histogram(
+    "transcriptron_http_request_seconds", "HTTP request handling time", ("method", "path", "status")
+)
+stage_seconds = registry.histogram(
+    "transcriptron_stage_seconds", "Time spent in a pipeline stage", ("stage",)
+)
+telegram_call_seconds = registry.histogram(
+    "transcriptron_telegram_call_seconds", "Telegram Bot API call time", ("method",)
+)
+retries_total = registry.counter(
+    "transcriptron_retries_total", "Retried upstream calls", ("service",)
+)
+rate_limited_total = registry.counter(
+    "transcriptron_rate_limited_total", "Upstream 429 responses", ("service",)
+)
+waiters = registry.gauge(
+    "transcriptron_waiters", "Tasks waiting on a semaphore or rate limiter", ("resource",)
+)
+nats_inflight = registry.gauge(
+    "transcriptron_nats_inflight", "NATS handler tasks currently running", ("subject",)
+)
+
+def semaphore_waiters(semaphore) -> Callable[[], float]:
+    return lambda: semaphore.statistics().tasks_waiting
+
+class CountingLimiter:
+    """Wraps a rate limiter, counting the tasks currently inside wait()"""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.waiting = 0
+
+    async def wait(self):
+        self.waiting += 1
+        try:
+            await self.limiter.wait()
+        finally:
+            self.waiting -= 1
+
+def limiter_waiters(limiter: CountingLimiter) -> Callable[[], float]:
+    return lambda: limiter.waiting
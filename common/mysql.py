@@ -1,19 +1,39 @@
+import os
+import json
+import time
 import logging
+from datetime import datetime
+from collections import deque
 from contextlib import contextmanager, asynccontextmanager
-from typing import Optional, Type, Union
+from typing import Optional, Type, Union, Dict, List, Tuple, Deque, AsyncIterator
 
-from common.config import MYSQL_CFG
+from common.config import MYSQL_CFG, MYSQL_BACKEND, MYSQL_WRITE_BEHIND_CFG
+from common.metrics import registry, waiters, semaphore_waiters
 
 from mysql.connector import Error
 from mysql.connector.pooling import MySQLConnectionPool
+import aiomysql
 import anyio
-from anyio import to_thread, Semaphore, get_cancelled_exc_class, CancelScope
+from anyio import to_thread, Semaphore, Lock, Event, get_cancelled_exc_class, CancelScope
 
 logger = logging.getLogger("mysql")
 
+write_behind_failed_rows = registry.gauge(
+    "transcriptron_write_behind_failed_rows", "Rows from failed batches waiting to be retried"
+)
+write_behind_spilled_total = registry.counter(
+    "transcriptron_write_behind_spilled_total", "Failed rows appended to the write-behind spill file"
+)
+write_behind_dropped_total = registry.counter(
+    "transcriptron_write_behind_dropped_total", "Failed rows lost because the spill file could not be written"
+)
+
 class MySQL:
     _instance: Optional[MySQLConnectionPool] = None
     _semaphore = Semaphore(MYSQL_CFG.get("pool_size", 5))
+    _apool = None
+    _apool_lock = Lock()
+    backend = MYSQL_BACKEND
 
     @classmethod
     def get_pool(cls) -> MySQLConnectionPool:
@@ -120,19 +140,347 @@ class MySQL:
                 if cursor:
                     cursor.close()
     
+    @classmethod
+    async def get_apool(cls):
+        if cls._apool is None:
+            async with cls._apool_lock:
+                if cls._apool is None:
+                    cls._apool = await aiomysql.create_pool(
+                        host=MYSQL_CFG.get("host"),
+                        user=MYSQL_CFG.get("user"),
+                        password=MYSQL_CFG.get("password"),
+                        db=MYSQL_CFG.get("database"),
+                        minsize=1,
+                        maxsize=MYSQL_CFG.get("pool_size", 5),
+                        autocommit=False,
+                        pool_recycle=3600
+                    )
+                    logger.info("Async MySQL pool created")
+        return cls._apool
+
+    @classmethod
+    @asynccontextmanager
+    async def aconnection(cls):
+        pool = await cls.get_apool()
+        async with pool.acquire() as con:
+            try:
+                yield con
+            except Exception as e:
+                logger.error(f"Database error: {e}")
+                await con.rollback()
+                raise
+
+    @classmethod
+    async def aclose(cls):
+        if cls._apool is not None:
+            cls._apool.close()
+            await cls._apool.wait_closed()
+            cls._apool = None
+            logger.info("Async MySQL pool closed")
+
+    @classmethod
+    async def _native_query(cls, query, params=None, fetch_one=False):
+        async with cls.aconnection() as con:
+            async with con.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params or ())
+                if fetch_one:
+                    result = await cursor.fetchone()
+                    logger.debug(f"Query executed (fetch_one): {query[:100]}...")
+                else:
+                    result = await cursor.fetchall()
+                    logger.debug(f"Query executed: {query[:100]}... | Rows returned: {len(result)}")
+            # Ends the implicit read transaction so the pooled connection sees fresh data
+            await con.commit()
+            return result
+
+    @classmethod
+    async def _native_update(cls, query, params=None):
+        async with cls.aconnection() as con:
+            async with con.cursor() as cursor:
+                await cursor.execute(query, params or ())
+                await con.commit()
+                affected_rows = cursor.rowcount
+                logger.debug(f"Update executed: {query[:100]}... | Affected rows: {affected_rows}")
+                return affected_rows
+
+    @classmethod
+    async def _native_insert(cls, query, params=None):
+        async with cls.aconnection() as con:
+            async with con.cursor() as cursor:
+                await cursor.execute(query, params or ())
+                await con.commit()
+                last_id = cursor.lastrowid
+                logger.debug(f"Insert executed: {query[:100]}... | Last ID: {last_id}")
+                return last_id
+
+    @classmethod
+    async def _native_many(cls, query, params_list):
+        async with cls.aconnection() as con:
+            async with con.cursor() as cursor:
+                await cursor.executemany(query, params_list)
+                await con.commit()
+                affected_rows = cursor.rowcount
+                logger.debug(f"Bulk operation: {query[:100]}... | Affected rows: {affected_rows}")
+                return affected_rows
+
+    @classmethod
+    async def astream(
+        cls,
+        query,
+        params = None,
+        batch_size: int = 1000,
+        dictionary: bool = True
+    ) -> AsyncIterator[list]:
+        """
+        Yields result rows in lists of at most batch_size from an unbuffered
+        cursor, so memory stays flat however large the result is. The pooled
+        connection is held only while the generator is being iterated; closing
+        it early drains the remaining rows, as the MySQL protocol requires.
+        """
+        if cls.backend == "aiomysql":
+            async for batch in cls._native_stream(query, params, batch_size, dictionary):
+                yield batch
+            return
+
+        async with cls._semaphore:
+            pool = cls.get_pool()
+            con = await to_thread.run_sync(pool.get_connection)
+            cursor = None
+            try:
+                cursor = con.cursor(buffered=False, dictionary=dictionary)
+                await to_thread.run_sync(cursor.execute, query, params or ())
+                rows = 0
+                while True:
+                    batch = await to_thread.run_sync(cursor.fetchmany, batch_size)
+                    if not batch:
+                        break
+                    rows += len(batch)
+                    yield batch
+                logger.debug(f"Query streamed: {query[:100]}... | Rows returned: {rows}")
+            finally:
+                with CancelScope(shield=True):
+                    if cursor:
+                        await to_thread.run_sync(cls._close_unbuffered, con, cursor)
+                    if con.is_connected():
+                        await to_thread.run_sync(con.close)
+
+    @staticmethod
+    def _close_unbuffered(con, cursor):
+        try:
+            if con.unread_result:
+                con.consume_results()
+            cursor.close()
+        except Error as e:
+            logger.error(f"Error closing streaming cursor: {e}")
+
+    @classmethod
+    async def _native_stream(cls, query, params, batch_size, dictionary):
+        cursor_class = aiomysql.SSDictCursor if dictionary else aiomysql.SSCursor
+        async with cls.aconnection() as con:
+            cursor = await con.cursor(cursor_class)
+            try:
+                await cursor.execute(query, params or ())
+                while True:
+                    batch = await cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield batch
+            finally:
+                with CancelScope(shield=True):
+                    await cursor.close()
+                    await con.commit()
+
     @classmethod
     async def aexecute_query(cls, query, params=None, fetch_one=False):
+        if cls.backend == "aiomysql":
+            return await cls._native_query(query, params, fetch_one)
         async with cls._semaphore:
             return await to_thread.run_sync(cls.execute_query, query, params, fetch_one)
     @classmethod
     async def aexecute_update(cls, query, params=None):
+        if cls.backend == "aiomysql":
+            return await cls._native_update(query, params)
         async with cls._semaphore:
             return await to_thread.run_sync(cls.execute_update, query, params)
     @classmethod
     async def aexecute_insert(cls, query, params=None):
+        if cls.backend == "aiomysql":
+            return await cls._native_insert(query, params)
         async with cls._semaphore:
             return await to_thread.run_sync(cls.execute_insert, query, params)
     @classmethod
     async def aexecute_many(cls, query, params_list):
+        if cls.backend == "aiomysql":
+            return await cls._native_many(query, params_list)
         async with cls._semaphore:
-            return await to_thread.run_sync(cls.execute_many, query, params_list)
\ No newline at end of file
+            return await to_thread.run_sync(cls.execute_many, query, params_list)
+
+class WriteBehind:
+    """
+    Buffers rows per statement and writes them with one executemany/commit per
+    batch. Rows from failed batches are kept and retried every retry_interval;
+    past max_failed, and at shutdown, they are appended to spill_path instead,
+    and the next start replays that file. Rows are only lost if the spill
+    itself fails, which is logged and counted.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = 500,
+        flush_interval: float = 1.0,
+        max_rows: int = 10000,
+        max_failed: int = 10000,
+        retry_interval: float = 30.0,
+        spill_path: str = "write_behind_spill.jsonl"
+    ):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self.max_failed = max_failed
+        self.retry_interval = retry_interval
+        self.spill_path = spill_path
+        self._buffers: Dict[str, List[tuple]] = {}
+        self._buffered = 0
+        self._failed: Deque[Tuple[str, tuple]] = deque()
+        self._flush_lock = Lock()
+
+    @property
+    def buffered(self) -> int:
+        return self._buffered
+
+    @property
+    def failed(self) -> int:
+        return len(self._failed)
+
+    async def serve(self, shutdown_event: Event):
+        await self.replay_spilled()
+        # Final flush happens in Service.stop, after the task group is gone
+        last_retry = time.monotonic()
+        while not shutdown_event.is_set():
+            with anyio.move_on_after(self.flush_interval):
+                await shutdown_event.wait()
+            if self._failed and time.monotonic() - last_retry >= self.retry_interval:
+                last_retry = time.monotonic()
+                await self.retry_failed()
+            await self.flush()
+
+    async def add(self, query: str, params: tuple):
+        self._buffers.setdefault(query, []).append(params)
+        self._buffered += 1
+
+        # Full buffers are flushed by the producer, which bounds memory by
+        # making writers wait for the database instead of queueing forever
+        if self._buffered >= self.max_rows:
+            await self.flush()
+        elif len(self._buffers[query]) >= self.max_batch:
+            await self.flush(query)
+
+    async def flush(self, query: Optional[str] = None) -> int:
+        async with self._flush_lock:
+            queries = [query] if query else list(self._buffers)
+            written = 0
+            for q in queries:
+                rows = self._buffers.pop(q, None)
+                if not rows:
+                    continue
+                self._buffered -= len(rows)
+                for start in range(0, len(rows), self.max_batch):
+                    batch = rows[start:start + self.max_batch]
+                    try:
+                        await MySQL.aexecute_many(q, batch)
+                        written += len(batch)
+                    except Exception as e:
+                        logger.error(f"Write-behind flush failed for {q[:100]}... ({len(batch)} rows): {e}")
+                        await self._keep_failed([(q, row) for row in batch])
+            if written:
+                logger.debug(f"Write-behind flushed {written} rows")
+            return written
+
+    async def _keep_failed(self, rows: List[Tuple[str, tuple]]):
+        self._failed.extend(rows)
+        over = len(self._failed) - self.max_failed
+        if over > 0:
+            await self.spill([self._failed.popleft() for _ in range(over)])
+        write_behind_failed_rows.set(len(self._failed))
+
+    def take_failed(self) -> List[Tuple[str, tuple]]:
+        """Returns and forgets (query, params) pairs whose batch failed to write"""
+        failed = list(self._failed)
+        self._failed.clear()
+        write_behind_failed_rows.set(0)
+        return failed
+
+    async def retry_failed(self):
+        failed = self.take_failed()
+        if failed:
+            logger.info(f"Retrying {len(failed)} failed write-behind rows")
+        for query, params in failed:
+            await self.add(query, params)
+
+    async def spill(self, rows: List[Tuple[str, tuple]]):
+        """Appends rows to spill_path; they are only dropped if that fails too"""
+        if not rows:
+            return
+        lines = "".join(
+            json.dumps({'query': query, 'params': params}, default=_encode_param) + "\n"
+            for query, params in rows
+        )
+        try:
+            await to_thread.run_sync(_append, self.spill_path, lines)
+            write_behind_spilled_total.inc(len(rows))
+            logger.warning(f"Spilled {len(rows)} failed write-behind rows to {self.spill_path}")
+        except OSError as e:
+            write_behind_dropped_total.inc(len(rows))
+            logger.error(f"Dropped {len(rows)} failed write-behind rows, could not spill to {self.spill_path}: {e}")
+
+    async def replay_spilled(self):
+        """Re-queues rows spilled by an earlier run; any that fail again are spilled anew"""
+        replay = f"{self.spill_path}.replay"
+        # A replay file left by a run that died mid-replay goes first
+        if not os.path.exists(replay):
+            try:
+                await to_thread.run_sync(os.replace, self.spill_path, replay)
+            except FileNotFoundError:
+                return
+            except OSError as e:
+                logger.error(f"Could not replay {self.spill_path}: {e}")
+                return
+
+        lines = await to_thread.run_sync(_read_lines, replay)
+        for line in lines:
+            try:
+                row = json.loads(line, object_hook=_decode_param)
+            except ValueError:
+                logger.error(f"Skipping corrupt spilled row in {replay}")
+                continue
+            await self.add(row['query'], tuple(row['params']))
+        await self.flush()
+        await to_thread.run_sync(os.remove, replay)
+        logger.info(f"Replayed {len(lines)} spilled write-behind rows")
+
+def _encode_param(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    raise TypeError(f"Cannot spill {type(value).__name__}")
+
+def _decode_param(obj: dict):
+    if '$datetime' in obj:
+        return datetime.fromisoformat(obj['$datetime'])
+    return obj
+
+def _append(path: str, text: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _read_lines(path: str) -> List[str]:
+    with open(path) as f:
+        return [line for line in f if line.strip()]
+
+write_behind = WriteBehind(**MYSQL_WRITE_BEHIND_CFG)
+
+waiters.set_function(semaphore_waiters(MySQL._semaphore), resource="mysql_semaphore")
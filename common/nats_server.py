@@ -1,9 +1,12 @@
-import json
 import logging
 from typing import Dict, Any, Optional, List, Callable
 from datetime import datetime
 
-from common.config import NATS_CFG
+from common.config import NATS_CFG, NATS_QUEUE, SERVICE_INSTANCE
+from common.metrics import nats_inflight
+from common.tracing import span, inject, extract, restore
+from common.utils import encode_json, decode_json
+from common import startup
 
 import nats
 import anyio
@@ -19,6 +22,7 @@ class NATSServer:
         self.pending_responders: List[tuple] = []
         self._task_group: Optional[TaskGroup] = None
         self._shutdown_event: Optional[Event] = None
+        self.inflight: Dict[int, Dict[str, Any]] = {}
     
     async def serve(self, task_group: TaskGroup, shutdown_event: Event):
         self._task_group = task_group
@@ -45,6 +49,7 @@ class NATSServer:
                 logger.info("Connected to NATS server")
 
                 await self._register_pending_handlers()
+                startup.mark("nats_connected")
             except Exception as e:
                 logger.error(f"Failed to connect to NATS: {e}")
                 raise
@@ -61,31 +66,53 @@ class NATSServer:
         for subject, handler in self.pending_subscribers:
             async def wrapper(msg, h=handler, subj=subject):
                 async def handle_safely(msg, h, subj):
+                    nats_inflight.inc(subject=subj)
+                    trace = extract(msg.headers)
+                    token = object()
                     try:
-                        data = json.loads(msg.data.decode()) if msg.data else {}
-                        await h(data)
+                        data = decode_json(msg.data) if msg.data else {}
+                        self.inflight[id(token)] = {
+                            'subject': subj,
+                            'job_id': data.get('job_id') if isinstance(data, dict) else None,
+                            'started_at': datetime.now().isoformat(),
+                        }
+                        with span(subj, handler=h.__name__):
+                            await h(data)
                     except Exception as e:
                         logger.error(f"Error in {subj}: {e}", exc_info=True)
+                    finally:
+                        self.inflight.pop(id(token), None)
+                        nats_inflight.dec(subject=subj)
+                        restore(trace)
                 
                 self._task_group.start_soon(handle_safely, msg, h, subj)
             
-            await self._connection.subscribe(subject, cb=wrapper)
+            await self._connection.subscribe(subject, queue=NATS_QUEUE, cb=wrapper)
             logging.info(f"Registered subscription: {subject}")
 
         for subject, handler in self.pending_responders:
             async def wrapper(msg, h=handler, subj=subject):
+                # Runs in nats-py's long-lived subscription task, so the
+                # adopted trace must not outlive this message
+                trace = extract(msg.headers)
                 try:
-                    data = json.loads(msg.data.decode()) if msg.data else {}
-                    result = await h(data)
-                    response = json.dumps(result).encode()
+                    data = decode_json(msg.data) if msg.data else {}
+                    with span(subj, handler=h.__name__):
+                        result = await h(data)
+                    response = encode_json(result)
                     await msg.respond(response)
                 except Exception as e:
                     logger.error(f"Error handling {subj}: {e}")
-                    error_response = json.dumps({"error": str(e)}).encode()
+                    error_response = encode_json({"error": str(e)})
                     await msg.respond(error_response)
+                finally:
+                    restore(trace)
 
-            await self._connection.subscribe(subject, cb=wrapper)
-            logging.info(f"Registered responder: {subject}")
+            # Every process answers on the shared subject (collect them all with
+            # nats req <subject> '' --replies 0) and alone on <subject>.<instance>
+            for subj in (subject, f"{subject}.{SERVICE_INSTANCE}"):
+                await self._connection.subscribe(subj, cb=wrapper)
+            logging.info(f"Registered responder: {subject} and {subject}.{SERVICE_INSTANCE}")
 
     def sub(self, subject: str):
         def decorator(func: Callable):
@@ -100,12 +127,12 @@ class NATSServer:
         return decorator
     
     async def pub(self, subject: str, data: dict):
-        message = json.dumps(data).encode()
-        await self._connection.publish(subject, message)
+        message = encode_json(data)
+        await self._connection.publish(subject, message, headers=inject() or None)
 
     async def request(self, subject:str, data: dict, timeout: int = 5):
-        message = json.dumps(data).encode()
-        response = await self._connection.request(subject, message, timeout=timeout)
-        return json.loads(response.data.decode()) if response.data else None
+        message = encode_json(data)
+        response = await self._connection.request(subject, message, timeout=timeout, headers=inject() or None)
+        return decode_json(response.data) if response.data else None
     
 nc = NATSServer()
\ No newline at end of file
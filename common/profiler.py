@@ -0,0 +1,106 @@
+import os
+import sys
+import time
+import io
+import pstats
+import cProfile
+import logging
+import threading
+from collections import Counter
+from typing import Optional
+
+from common.config import PROFILE_DIR
+
+import anyio
+from anyio import to_thread
+
+logger = logging.getLogger("profiler")
+
+MAX_SECONDS = 120
+
+class Profiler:
+    """On-demand profiling of the live process, one capture at a time"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.running: Optional[dict] = None
+
+    def _path(self, suffix: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.{suffix}")
+
+    async def capture(self, seconds: float, mode: str = "sample", interval: float = 0.005, top: int = 20) -> dict:
+        if self.running:
+            raise RuntimeError(f"Profile already running since {self.running['started_at']}")
+        seconds = max(0.1, min(float(seconds), MAX_SECONDS))
+
+        self.running = {'mode': mode, 'seconds': seconds, 'started_at': time.time()}
+        logger.info(f"Starting {mode} profile for {seconds}s")
+        try:
+            if mode == "cprofile":
+                return await self._cprofile(seconds, top)
+            return await to_thread.run_sync(self._sample, seconds, interval, top)
+        finally:
+            self.running = None
+
+    def _sample(self, seconds: float, interval: float, top: int) -> dict:
+        """Samples every thread's stack, including the event loop, into collapsed-stack format"""
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                parts.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(parts))] += 1
+            samples += 1
+            time.sleep(interval)
+
+        path = self._path("folded")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+
+        logger.info(f"Sampling profile written to {path}")
+        return {
+            'mode': 'sample',
+            'path': path,
+            'samples': samples,
+            'top': [{'frame': frame, 'samples': count} for frame, count in leaves.most_common(top)],
+        }
+
+    async def _cprofile(self, seconds: float, top: int) -> dict:
+        """Deterministic profile of everything that runs on the event loop thread"""
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await anyio.sleep(seconds)
+        finally:
+            profile.disable()
+
+        path = self._path("pstats")
+
+        def dump():
+            profile.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(top)
+            return out.getvalue()
+
+        summary = await to_thread.run_sync(dump)
+        logger.info(f"cProfile written to {path}")
+        return {'mode': 'cprofile', 'path': path, 'summary': summary}
+
+profiler = Profiler(PROFILE_DIR)
@@ -0,0 +1,179 @@
+"""
+Startup timing. Milestones (imports done, NATS connected, HTTP listening,
+first webhook accepted) are always recorded as seconds since the process
+started, together with the first-use cost of lazily initialized clients.
+
+With STARTUP_PROFILE=1 every module import on the main thread is timed as
+well, and a report is written to PROFILE_DIR when the first webhook is
+accepted. STARTUP_PROFILE and STARTUP_BUDGET are read here rather than in
+common.config because this module must be imported, and the hook installed,
+before anything else.
+"""
+import os
+import sys
+import json
+import time
+import builtins
+import importlib
+import importlib.util
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from common.metrics import registry
+
+logger = logging.getLogger("startup")
+
+PROFILE = os.environ.get("STARTUP_PROFILE", "0") == "1"
+BUDGET = float(os.environ.get("STARTUP_BUDGET", 10))
+
+startup_seconds = registry.gauge(
+    "transcriptron_startup_seconds", "Seconds from process start to a startup milestone", ("milestone",)
+)
+init_seconds = registry.gauge(
+    "transcriptron_init_seconds", "First-use initialization time of lazily created clients", ("component",)
+)
+
+def _process_started() -> float:
+    """time.time() at which this process was created, so interpreter startup counts too"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22, after the parenthesised command name which may contain spaces
+            ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+PROCESS_STARTED = _process_started()
+
+milestones: Dict[str, float] = {}
+inits: Dict[str, float] = {}
+# module -> (cumulative, self) seconds
+imports: Dict[str, Tuple[float, float]] = {}
+
+_original_import = builtins.__import__
+_main_thread = threading.get_ident()
+_stack = []
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if threading.get_ident() != _main_thread:
+        return _original_import(name, globals, locals, fromlist, level)
+    try:
+        resolved = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__") or "") if level else name
+    except (ImportError, ValueError):
+        resolved = name
+    if resolved in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    started = time.perf_counter()
+    _stack.append(0.0)
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = _stack.pop()
+        if _stack:
+            _stack[-1] += elapsed
+        if resolved in sys.modules and resolved not in imports:
+            imports[resolved] = (elapsed, elapsed - nested)
+
+def install():
+    if PROFILE and builtins.__import__ is not _timed_import:
+        builtins.__import__ = _timed_import
+
+def uninstall():
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+
+def age() -> float:
+    return time.time() - PROCESS_STARTED
+
+def mark(milestone: str):
+    """Records the first time a milestone is reached; later calls are free"""
+    if milestone in milestones:
+        return
+    seconds = milestones[milestone] = round(age(), 4)
+    startup_seconds.set(seconds, milestone=milestone)
+    logger.info(f"Startup milestone {milestone} at {seconds:.3f}s")
+
+    if milestone in ("nats_connected", "http_listening") and "ready" not in milestones:
+        if "nats_connected" in milestones and "http_listening" in milestones:
+            mark("ready")
+            if BUDGET and seconds > BUDGET:
+                logger.warning(f"Startup took {seconds:.3f}s, over the {BUDGET:.1f}s budget")
+
+    if milestone == "first_webhook" and PROFILE:
+        write_report()
+
+@contextmanager
+def timed(component: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if component not in inits:
+            seconds = inits[component] = round(time.perf_counter() - started, 4)
+            init_seconds.set(seconds, component=component)
+            logger.info(f"Initialized {component} in {seconds:.3f}s")
+
+def lazy_import(name: str):
+    """
+    Imports a heavy module on first use, recording how long that took.
+    Safe to call from a worker thread; see warm().
+    """
+    module = sys.modules.get(name)
+    if module is None:
+        with timed(f"import {name}"):
+            module = importlib.import_module(name)
+    return module
+
+async def warm(modules):
+    """
+    Imports modules deferred by lazy_import or lazy client properties in a
+    worker thread once the service is ready, so the first request that
+    needs them does not import them on the event loop
+    """
+    import anyio
+    from anyio import to_thread
+
+    while "ready" not in milestones:
+        await anyio.sleep(0.1)
+    for name in modules:
+        try:
+            await to_thread.run_sync(lazy_import, name)
+        except ImportError as e:
+            logger.warning(f"Could not preload {name}: {e}")
+
+def summary(top: int = 30) -> dict:
+    packages: Dict[str, float] = {}
+    for module, (_, own) in imports.items():
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + own
+    slowest = sorted(imports.items(), key=lambda kv: kv[1][1], reverse=True)[:top]
+    return {
+        'pid': os.getpid(),
+        'budget': BUDGET,
+        'milestones': milestones,
+        'inits': inits,
+        'import_seconds': round(sum(own for _, own in imports.values()), 4),
+        'packages': {k: round(v, 4) for k, v in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]},
+        'modules': [
+            {'module': m, 'cumulative': round(cum, 4), 'self': round(own, 4)} for m, (cum, own) in slowest
+        ],
+    }
+
+def write_report():
+    from common.config import PROFILE_DIR
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"startup-{os.getpid()}.json")
+        with open(path, "w") as f:
+            json.dump(summary(), f, indent=2)
+        logger.info(f"Startup profile written to {path}")
+    except OSError as e:
+        logger.warning(f"Could not write startup profile: {e}")
+
+install()
@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import logging
+import subprocess
+from typing import Dict, List, Tuple
+
+from common.config import BASE_DIR, FASTAPI_CFG, NATS_CFG
+from common.metrics import registry
+import schedules
+
+import anyio
+from anyio import Event
+from anyio.abc import Process
+
+logger = logging.getLogger("supervisor")
+
+supervisor_restarts_total = registry.counter(
+    "transcriptron_supervisor_restarts_total", "Child processes restarted after exiting", ("role",)
+)
+
+class Supervisor:
+    """
+    Runs ingest, the scheduler (when it has jobs) and N worker processes as
+    children of this one and restarts any that exit, backing off while they
+    keep failing. Each child gets its own HTTP port (ingest keeps
+    FASTAPI_PORT, the rest count up from it for /metrics), log directory,
+    NATS connection name and diagnostics subject suffix.
+    """
+
+    def __init__(self, workers: int, restart_delay: float = 1.0, max_restart_delay: float = 30.0, stop_timeout: float = 30.0):
+        self.workers = workers
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stop_timeout = stop_timeout
+        self.processes: Dict[str, Process] = {}
+        self._stopping = False
+
+    def children(self) -> List[Tuple[str, str]]:
+        """(name, role) for every child, in port order"""
+        # The scheduler only runs jobs, so it is left out while it has none
+        scheduler = [('scheduler', 'scheduler')] if schedules.ROLES.get('scheduler') else []
+        return [('ingest', 'ingest')] + scheduler + [
+            (f"worker-{i}", 'worker') for i in range(1, self.workers + 1)
+        ]
+
+    def child_env(self, index: int, name: str, role: str) -> dict:
+        log_path = os.path.join(os.environ.get("LOG_PATH") or "", name) + "/"
+        os.makedirs(log_path, exist_ok=True)
+        return os.environ | {
+            'SERVICE_ROLE': role,
+            'SERVICE_INSTANCE': name,
+            'FASTAPI_PORT': str(FASTAPI_CFG['port'] + index),
+            'NATS_NAME': f"{NATS_CFG['name'] or 'transcriptron'}-{name}",
+            'LOG_PATH': log_path,
+            # Ingest and every worker call the upstream APIs; the scheduler does not
+            'SERVICE_PROCESSES': str(self.workers + 1),
+        } | self.spill_env(name)
+
+    @staticmethod
+    def spill_env(name: str) -> dict:
+        # Without MYSQL_WB_SPILL_PATH the default already lives under the child's
+        # LOG_PATH; an explicit one would be shared, and every child would
+        # replay (and so duplicate) the others' spilled rows at startup
+        spill_path = os.environ.get("MYSQL_WB_SPILL_PATH")
+        if not spill_path:
+            return {}
+        root, ext = os.path.splitext(spill_path)
+        return {'MYSQL_WB_SPILL_PATH': f"{root}.{name}{ext}"}
+
+    async def serve(self, shutdown_event: Event):
+        logger.info(f"Supervising {', '.join(name for name, _ in self.children())}")
+        async with anyio.create_task_group() as tg:
+            for index, (name, role) in enumerate(self.children()):
+                tg.start_soon(self._run, name, role, self.child_env(index, name, role))
+            await shutdown_event.wait()
+
+    async def _run(self, name: str, role: str, env: dict):
+        delay = self.restart_delay
+        while not self._stopping:
+            started = time.monotonic()
+            process = await anyio.open_process(
+                [sys.executable, str(BASE_DIR / "main.py"), "--role", role],
+                stdin=subprocess.DEVNULL, stdout=None, stderr=None, env=env
+            )
+            self.processes[name] = process
+            logger.info(f"Started {name} (pid {process.pid})")
+
+            returncode = await process.wait()
+            if self._stopping:
+                return
+
+            # A child that stayed up for a while gets a fresh backoff
+            if time.monotonic() - started > 60:
+                delay = self.restart_delay
+            logger.error(f"{name} exited with {returncode}, restarting in {delay:.0f}s")
+            supervisor_restarts_total.inc(role=role)
+            await anyio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+
+    async def stop(self):
+        """SIGTERM every child, then SIGKILL whatever is still running after stop_timeout"""
+        self._stopping = True
+        running = [p for p in self.processes.values() if p.returncode is None]
+        for process in running:
+            process.terminate()
+
+        with anyio.move_on_after(self.stop_timeout):
+            for process in running:
+                await process.wait()
+
+        for name, process in self.processes.items():
+            if process.returncode is None:
+                logger.error(f"{name} did not stop within {self.stop_timeout:.0f}s, killing")
+                process.kill()
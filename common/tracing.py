@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Optional, Dict, Tuple, Deque
+
+from common.config import TRACE_CFG
+
+import anyio
+import httpx
+from anyio import Event, to_thread
+
+logger = logging.getLogger("tracing")
+
+TRACE_HEADER = "Trace-Id"
+PARENT_HEADER = "Parent-Span-Id"
+
+# (trace_id, span_id) of the span currently running in this task
+_current: ContextVar[Optional[Tuple[str, str]]] = ContextVar("trace", default=None)
+
+def current_trace_id() -> Optional[str]:
+    ctx = _current.get()
+    return ctx[0] if ctx else None
+
+def inject() -> Dict[str, str]:
+    """NATS headers carrying the current trace to the next stage"""
+    ctx = _current.get()
+    if not ctx:
+        return {}
+    return {TRACE_HEADER: ctx[0], PARENT_HEADER: ctx[1]}
+
+def extract(headers: Optional[Dict[str, str]]) -> Optional[Token]:
+    """
+    Adopts the trace from incoming NATS headers. Pass the returned token to
+    restore() when the message is handled, so the trace does not stick to
+    later messages handled in the same task.
+    """
+    if headers and headers.get(TRACE_HEADER):
+        return _current.set((headers[TRACE_HEADER], headers.get(PARENT_HEADER, "")))
+    return None
+
+def restore(token: Optional[Token]):
+    if token is not None:
+        _current.reset(token)
+
+class TraceContextFilter(logging.Filter):
+    def filter(self, record):
+        # Already stamped in the calling task when records pass through the log queue
+        if not hasattr(record, 'trace_id'):
+            record.trace_id = current_trace_id() or "-"
+        return True
+
+class Tracer:
+    def __init__(self, exporter: str, path: str, endpoint: str, max_buffer: int, flush_interval: float):
+        self.exporter = exporter
+        self.path = path
+        self.endpoint = endpoint
+        self.flush_interval = flush_interval
+        self._buffer: Deque[dict] = deque(maxlen=max_buffer)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporter)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current.get()
+        trace_id = parent[0] if parent else os.urandom(16).hex()
+        span_id = os.urandom(8).hex()
+        token = _current.set((trace_id, span_id))
+        started = time.time_ns()
+        status = "ok"
+        try:
+            yield trace_id
+        except BaseException as e:
+            status = "error"
+            attributes['error'] = repr(e)
+            raise
+        finally:
+            _current.reset(token)
+            if self.exporter:
+                self._buffer.append({
+                    'trace_id': trace_id,
+                    'span_id': span_id,
+                    'parent_id': parent[1] if parent else None,
+                    'name': name,
+                    'start_ns': started,
+                    'end_ns': time.time_ns(),
+                    'status': status,
+                    'attributes': attributes,
+                })
+
+    async def serve(self, shutdown_event: Event):
+        if not self.exporter:
+            return
+        while not shutdown_event.is_set():
+            with anyio.move_on_after(self.flush_interval):
+                await shutdown_event.wait()
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        spans = list(self._buffer)
+        self._buffer.clear()
+        try:
+            if self.exporter == "otlp":
+                await self._export_otlp(spans)
+            else:
+                await to_thread.run_sync(self._export_jsonl, spans)
+        except Exception as e:
+            logger.warning(f"Dropped {len(spans)} spans: {e}")
+
+    def _export_jsonl(self, spans):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(s, default=str) + "\n")
+
+    async def _export_otlp(self, spans):
+        def attrs(d):
+            return [{'key': k, 'value': {'stringValue': str(v)}} for k, v in d.items()]
+
+        payload = {
+            'resourceSpans': [{
+                'resource': {'attributes': attrs({'service.name': 'transcriptron'})},
+                'scopeSpans': [{
+                    'scope': {'name': 'transcriptron'},
+                    'spans': [{
+                        'traceId': s['trace_id'],
+                        'spanId': s['span_id'],
+                        'parentSpanId': s['parent_id'] or "",
+                        'name': s['name'],
+                        'kind': 1,
+                        'startTimeUnixNano': str(s['start_ns']),
+                        'endTimeUnixNano': str(s['end_ns']),
+                        'attributes': attrs(s['attributes']),
+                        'status': {'code': 1 if s['status'] == "ok" else 2},
+                    } for s in spans]
+                }]
+            }]
+        }
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.post(f"{self.endpoint}/v1/traces", json=payload)
+            response.raise_for_status()
+
+tracer = Tracer(**TRACE_CFG)
+span = tracer.span
@@ -0,0 +1,67 @@
+import json
+from typing import Any, List, Tuple
+
+def chunk_text(text: str, size: int) -> List[str]:
+    """Splits on the last space before size; walks offsets so long texts stay linear"""
+    if len(text) <= size:
+        return [text]
+    chunks = []
+    start = 0
+    end = len(text)
+    while start < end:
+        if end - start <= size:
+            chunks.append(text[start:])
+            break
+        split = text.rfind(" ", start, start + size)
+        if split == -1:
+            split = start + size
+        chunks.append(text[start:split])
+        start = split
+        while start < end and text[start].isspace():
+            start += 1
+    return chunks
+
+def split_message(text: str, max_length: int) -> List[str]:
+    """Splits preferring a newline in the last 20% of the window, then a space"""
+    chunks = []
+    start = 0
+    end = len(text)
+    while start < end:
+        if end - start <= max_length:
+            chunks.append(text[start:])
+            break
+
+        limit = start + max_length
+        split_index = text.rfind('\n', start, limit)
+        if split_index == -1 or split_index - start < max_length * 0.8:  # Don't split too early
+            split_index = text.rfind(' ', start, limit)
+        if split_index == -1:
+            split_index = limit
+
+        chunks.append(text[start:split_index])
+        start = split_index
+        while start < end and text[start].isspace():
+            start += 1
+    return chunks
+
+UPDATE_KINDS = ('video', 'voice', 'audio', 'video_note', 'text')
+
+def update_kind(message: dict) -> str | None:
+    """The message field the webhook dispatches on, in the same order"""
+    for kind in UPDATE_KINDS:
+        if kind in message:
+            return kind
+    return None
+
+def encode_json(data: Any) -> bytes:
+    return json.dumps(data).encode()
+
+def decode_json(payload: bytes) -> Any:
+    # json.loads accepts bytes directly, no intermediate str copy
+    return json.loads(payload)
+
+def parse_update(body: bytes) -> Tuple[dict, dict, Any, Any]:
+    """Returns (update, message, message_id, from_id) from a raw Telegram update"""
+    update_data = json.loads(body)
+    message = update_data.get("message") or {}
+    return update_data, message, message.get("message_id"), (message.get("from") or {}).get("id")
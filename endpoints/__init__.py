@@ -1,4 +1,6 @@
-from . import (
-    telegram,
-    rewrite
-)
\ No newline at end of file
+# Modules each process role imports; importing a module registers its routes
+ROLES = {
+    'ingest': ('telegram', 'rewrite', 'transcripts', 'metrics'),
+    'worker': ('metrics',),
+    'scheduler': ('metrics',),
+}
@@ -0,0 +1,11 @@
+from fastapi.responses import PlainTextResponse
+
+from common.fastapi_server import api
+from common.metrics import registry
+
+@api.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,18 +1,19 @@
 import logging
+import json
+import anyio
 from fastapi import Request, Header, HTTPException
+from fastapi.responses import StreamingResponse, JSONResponse
 
 from common.fastapi_server import api
-from common.config import REWRITE_SECRET
+from common.nats_server import nc
+from common.config import REWRITE_SECRET, REWRITE_BATCH_MAX, REWRITE_BATCH_CONCURRENCY
 from services.gemini import gemini_manager as g
+from services.rewrite_router import rewrite_router as r
+from services.rewrite_jobs import rewrite_jobs as jobs
 
 logger = logging.getLogger("rewrite")
 
-@api.post("/transcriptron/rewrite")
-@api.post("/transcriptron/rewrite/")
-async def rewrite_webhook(
-    request: Request,
-    authorization: str = Header(None)
-):
+async def parse_rewrite_request(request: Request, authorization: str) -> dict:
     if authorization != f"Bearer {REWRITE_SECRET}":
         raise HTTPException(status_code=401, detail="Unauthorized")
 
@@ -21,12 +22,189 @@ async def rewrite_webhook(
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    return body
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class ProducerStreamingResponse(StreamingResponse):
+    """
+    Runs producer beside the response in a task group owned by the request,
+    not by the body generator, and cancels it once the response is over,
+    whether the body finished or the client went away.
+    """
+
+    def __init__(self, content, producer, *args, **kwargs):
+        super().__init__(content, *args, **kwargs)
+        self.producer = producer
+
+    async def __call__(self, scope, receive, send):
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(self.producer)
+            try:
+                await super().__call__(scope, receive, send)
+            finally:
+                tg.cancel_scope.cancel()
+
+def shed_if_full():
+    if jobs.is_full():
+        raise HTTPException(
+            status_code=429,
+            detail="Rewrite queue is full",
+            headers={"Retry-After": str(jobs.retry_after())}
+        )
+
+async def submit_rewrite_job(text: str, callback_url: str | None):
+    shed_if_full()
+
+    position = jobs.depth
+    job = jobs.create(callback_url)
+    try:
+        await nc.pub("rewrite.job", {"job_id": job['job_id'], "text": text})
+    except Exception as e:
+        logger.error(f"Failed to enqueue rewrite job {job['job_id']}: {e}")
+        jobs.complete(job['job_id'], None, "Failed to enqueue")
+        raise HTTPException(status_code=503, detail="Rewrite queue unavailable")
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job['job_id'],
+            "status": job['status'],
+            "estimated_wait": jobs.estimated_wait(position + 1)
+        },
+        headers={"Location": f"/transcriptron/rewrite/jobs/{job['job_id']}"}
+    )
+
+@api.post("/transcriptron/rewrite")
+@api.post("/transcriptron/rewrite/")
+async def rewrite_webhook(
+    request: Request,
+    authorization: str = Header(None)
+):
+    body = await parse_rewrite_request(request, authorization)
+
     text = body.get("text")
     if not text or not isinstance(text, str):
         raise HTTPException(status_code=400, detail="Missing text")
 
-    rewrite = await g.correct_text(text)
+    if body.get("async"):
+        callback_url = body.get("callback_url")
+        if callback_url is not None:
+            if not isinstance(callback_url, str):
+                raise HTTPException(status_code=400, detail="Invalid callback_url")
+            reason = await jobs.check_callback(callback_url)
+            if reason:
+                raise HTTPException(status_code=400, detail=f"Invalid callback_url: {reason}")
+        return await submit_rewrite_job(text, callback_url)
+
+    shed_if_full()
+
+    rewrite = await r.correct_text(text)
     if not rewrite:
         raise HTTPException(status_code=502, detail="Rewrite failed")
 
-    return {"rewrite": rewrite}
\ No newline at end of file
+    return {"rewrite": rewrite}
+
+@api.post("/transcriptron/rewrite/stream")
+@api.post("/transcriptron/rewrite/stream/")
+async def rewrite_stream_webhook(
+    request: Request,
+    authorization: str = Header(None)
+):
+    body = await parse_rewrite_request(request, authorization)
+
+    text = body.get("text")
+    if not text or not isinstance(text, str):
+        raise HTTPException(status_code=400, detail="Missing text")
+
+    async def events():
+        try:
+            async for chunk in g.stream_text(text):
+                yield sse("chunk", {"text": chunk})
+        except Exception as e:
+            logger.error(f"Streaming rewrite failed: {e}")
+            yield sse("error", {"detail": "Rewrite failed"})
+            return
+        yield sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@api.post("/transcriptron/rewrite/batch")
+@api.post("/transcriptron/rewrite/batch/")
+async def rewrite_batch_webhook(
+    request: Request,
+    authorization: str = Header(None)
+):
+    body = await parse_rewrite_request(request, authorization)
+
+    texts = body.get("texts")
+    if not texts or not isinstance(texts, list):
+        raise HTTPException(status_code=400, detail="Missing texts")
+    if len(texts) > REWRITE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {REWRITE_BATCH_MAX} texts per batch")
+    if not all(isinstance(text, str) and text for text in texts):
+        raise HTTPException(status_code=400, detail="Every text must be a non-empty string")
+
+    try:
+        concurrency = min(
+            int(body.get("concurrency") or REWRITE_BATCH_CONCURRENCY),
+            REWRITE_BATCH_CONCURRENCY
+        )
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid concurrency")
+
+    send_stream, receive_stream = anyio.create_memory_object_stream(len(texts))
+
+    if not body.get("stream"):
+        results = [None] * len(texts)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(r.correct_many, texts, send_stream, concurrency)
+            async with receive_stream:
+                async for index, rewrite, error in receive_stream:
+                    results[index] = {"index": index, "rewrite": rewrite, "error": error}
+        return {"results": results}
+
+    async def events():
+        async with receive_stream:
+            async for index, rewrite, error in receive_stream:
+                yield sse("result", {"index": index, "rewrite": rewrite, "error": error})
+        yield sse("done", {})
+
+    return ProducerStreamingResponse(
+        events(),
+        lambda: r.correct_many(texts, send_stream, concurrency),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@api.get("/transcriptron/rewrite/jobs/{job_id}")
+async def rewrite_job_status(
+    job_id: str,
+    authorization: str = Header(None)
+):
+    if authorization != f"Bearer {REWRITE_SECRET}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    result = jobs.public(job)
+    if job['status'] == 'queued':
+        result['queue_depth'] = jobs.depth
+        result['estimated_wait'] = jobs.estimated_wait()
+    return result
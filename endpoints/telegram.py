@@ -14,6 +14,11 @@ from common.config import (
 )
 
 from services.telegram import TelegramBot as t
+from services.usage import usage_meter
+from services.capture import update_capture
+from common import startup
+from common.tracing import span, current_trace_id
+from common.utils import parse_update, update_kind
 
 from fastapi import Request, Header, HTTPException
 
@@ -36,61 +41,89 @@ async def get_voice_path(file_id):
     head_tail = os.path.split(docker_path)
     return DOCKER_VOICE_MOUNTPOINT + head_tail[1]
 
+async def dispatch_update(message: dict, data: dict):
+    if 'video' in message:
+        video = message.get('video')
+        file_path = await get_video_path(video['file_id'])
+    elif 'voice' in message:
+        voice = message.get('voice')
+        file_path = await get_voice_path(voice['file_id'])
+    elif 'audio' in message:
+        audio = message.get('audio')
+        file_path = await get_audio_path(audio['file_id'])
+    elif 'video_note' in message:
+        video_note = message.get('video_note')
+        file_path = await get_video_note_path(video_note['file_id'])
+    else:
+        text = message.get('text')
+        if not text:
+            return
+        data |= {'text': text}
+        await nc.pub("text.received", data)
+        return
+    
+    data |= {
+        'file_path': file_path,
+        'duration': (message.get(update_kind(message)) or {}).get('duration')
+    }
+    
+    await nc.pub(
+        "file.received", data
+    )
+
 @api.post("/webhook/telegram")
 @api.post("/webhook/telegram/")
 async def telegram_webhook(
     request: Request = None
 ):
+    # Root span: its trace id is the job id carried through every NATS hop
+    with span("telegram.webhook"):
+        return await handle_update(request)
+
+async def handle_update(request: Request):
 
     try:
+        arrived = time.time()
         body = await request.body()
 
         try:
-            update_data = json.loads(body.decode('utf-8'))
-            message = update_data.get("message", {})
-            message_id = message.get("message_id")
-            from_id = message.get("from", {}).get("id")
-            
-            if not from_id:
-                return {"status": "ok"}
+            update_data, message, message_id, from_id = parse_update(body)
+            accepted = bool(from_id) and int(from_id) in TELEGRAM_WHITELIST
+
+            if update_capture.enabled:
+                update_capture.record(arrived, message, accepted)
             
-            if int(from_id) not in TELEGRAM_WHITELIST:
+            if not accepted:
                 return {"status": "ok"}
             
             data = {
                 'message_id': message_id,
-                'from_id': from_id
+                'from_id': from_id,
+                'job_id': current_trace_id()
             }
-            
-            if 'video' in message:
-                video = message.get('video')
-                file_path = await get_video_path(video['file_id'])
-            elif 'voice' in message:
-                voice = message.get('voice')
-                file_path = await get_voice_path(voice['file_id'])
-            elif 'audio' in message:
-                audio = message.get('audio')
-                file_path = await get_audio_path(audio['file_id'])
-            elif 'video_note' in message:
-                video_note = message.get('video_note')
-                file_path = await get_video_note_path(video_note['file_id'])
-            else:
-                text = message.get('text')
-                if not text:
-                    return {"status": "ok"}
-                data |= {'text': text}
-                await nc.pub("text.received", data)
+
+            over_quota, usage_ticket = await usage_meter.admit(int(from_id), message)
+            if over_quota:
+                logger.info(f"Rejected update from {from_id}: {over_quota} quota exceeded")
+                await nc.pub("send.notice", data | {
+                    'text': "Whoa, slow down! You've hit your usage limit for now. Try again a bit later."
+                })
                 return {"status": "ok"}
+            if usage_ticket:
+                data['usage'] = usage_ticket
+
+            # Tags the trace so replays can match jobs back to the update they came from
+            with span("telegram.update", update_id=update_data.get('update_id'), kind=update_kind(message)):
+                try:
+                    await dispatch_update(message, data)
+                except Exception:
+                    # No worker will report for a job that was never published
+                    if usage_ticket:
+                        usage_meter.reconcile(int(from_id), usage_ticket, dict.fromkeys(usage_ticket['estimated'], 0))
+                    raise
+            startup.mark("first_webhook")
             
-            data |= {
-                'file_path': file_path
-            }
-            
-            await nc.pub(
-                "file.received", data
-            )
-            
-            logger.info(f"Received update:\n{json.dumps(update_data, indent=4)[:50]}...")
+            logger.info(f"Received update {update_data.get('update_id')} from {from_id}")
         except json.JSONDecodeError as e:
             logger.error(f"Failed to decode JSON: {e}")
             raise HTTPException(status_code=400, detail="Invalid JSON")
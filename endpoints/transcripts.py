@@ -0,0 +1,47 @@
+import hmac
+import logging
+from typing import Optional
+
+from fastapi import Header, HTTPException, Query
+
+from common.fastapi_server import api
+from common.config import TRANSCRIPTS_SECRET
+from services.transcripts import TranscriptArchive as archive, InvalidSearch
+
+logger = logging.getLogger("transcripts")
+
+def authorized(authorization: Optional[str]) -> bool:
+    # No secret configured means nobody gets in, not "Bearer None"
+    if not TRANSCRIPTS_SECRET or not authorization:
+        return False
+    return hmac.compare_digest(authorization.encode(), f"Bearer {TRANSCRIPTS_SECRET}".encode())
+
+@api.get("/transcriptron/transcripts")
+@api.get("/transcriptron/transcripts/")
+async def search_transcripts(
+    q: Optional[str] = Query(None, max_length=256),
+    from_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    authorization: str = Header(None)
+):
+    if not authorized(authorization):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    try:
+        rows, next_cursor = await archive.search(q=q, from_id=from_id, limit=limit, cursor=cursor)
+    except InvalidSearch as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except Exception as e:
+        logger.error(f"Transcript search failed: {e}")
+        raise HTTPException(status_code=500, detail="Search failed")
+
+    return {
+        "results": [
+            row | {"created_at": row['created_at'].isoformat()}
+            for row in rows
+        ],
+        "next_cursor": next_cursor
+    }
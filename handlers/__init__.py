@@ -1,3 +1,6 @@
-from . import (
-    handler
-)
\ No newline at end of file
+# Modules each process role imports; importing a module registers its subscribers
+ROLES = {
+    'ingest': ('rewrite_jobs', 'usage', 'diagnostics'),
+    'worker': ('handler', 'rewrite', 'diagnostics'),
+    'scheduler': ('diagnostics',),
+}
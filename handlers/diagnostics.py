@@ -0,0 +1,45 @@
+import os
+import logging
+
+from common.config import SERVICE_INSTANCE
+from common.nats_server import nc
+from common.metrics import waiters
+from common.profiler import profiler
+from common.loop_monitor import loop_monitor
+from common import startup
+from services.rewrite_jobs import rewrite_jobs as jobs
+from services.rewrite_router import rewrite_router as r
+from services.transcription_router import transcription_router as tr
+
+logger = logging.getLogger(__name__)
+
+SUBJECT_PREFIX = "transcriptron"
+
+@nc.reply(f"{SUBJECT_PREFIX}.profile")
+async def handle_profile(data: dict = {}):
+    """
+    {"seconds": 10, "mode": "sample" | "cprofile"}. The requester's timeout
+    must exceed the capture time. Address one process by instance name:
+    nats req transcriptron.profile.worker-1 ... --timeout 15s
+    """
+    result = await profiler.capture(
+        seconds=data.get("seconds", 10),
+        mode=data.get("mode", "sample"),
+        top=int(data.get("top", 20))
+    )
+    return result | {'pid': os.getpid(), 'instance': SERVICE_INSTANCE}
+
+@nc.reply(f"{SUBJECT_PREFIX}.state")
+async def handle_state(data: dict = {}):
+    return {
+        'pid': os.getpid(),
+        'instance': SERVICE_INSTANCE,
+        'inflight': list(nc.inflight.values()),
+        'waiters': {key[0]: value for key, value in waiters.values().items()},
+        'rewrite_queue_depth': jobs.depth,
+        'rewrite_providers': r.stats(),
+        'transcription_backends': tr.stats(),
+        'profile_running': profiler.running,
+        'last_loop_stall': loop_monitor.last_stall,
+        'startup': {'milestones': startup.milestones, 'inits': startup.inits},
+    }
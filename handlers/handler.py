@@ -2,28 +2,26 @@ import logging
 import os
 
 from common.nats_server import nc
-from services.gemini import gemini_manager as g
+from services.rewrite_router import rewrite_router as r
 from services.telegram import TelegramBot as t
 from services.openai_manager import openai_manager as o
+from services.transcription_router import transcription_router as tr
 from services.ffmpeg_manager import FFmpegManager as f
+from services.transcripts import TranscriptArchive as archive
+from services.scratch import scratch
+from common.utils import chunk_text
 
 logger = logging.getLogger(__name__)
 CHUNK_SIZE = 4000
 
-def chunk_text(text: str, size: int = CHUNK_SIZE) -> list[str]:
-    if len(text) <= size:
-        return [text]
-    chunks = []
-    while text:
-        if len(text) <= size:
-            chunks.append(text)
-            break
-        split = text.rfind(" ", 0, size)
-        if split == -1:
-            split = size
-        chunks.append(text[:split])
-        text = text[split:].lstrip()
-    return chunks
+async def report_usage(data: dict, **actual: float):
+    """Tells the ingest process what this job really used, so it can correct its estimate"""
+    if data.get("usage"):
+        await nc.pub("usage.reconcile", {
+            "from_id": data.get("from_id"),
+            "usage": data["usage"],
+            "actual": actual
+        })
 
 @nc.sub("file.received")
 async def handle_file(data: dict = {}):
@@ -31,23 +29,35 @@ async def handle_file(data: dict = {}):
     message_id = data.get("message_id")
     from_id = data.get("from_id")
     file_path = data.get("file_path")
+    duration = data.get("duration")
 
-    audio_path = await f.save_audio(file_path)
-    if not audio_path:
-        data['error'] = "Oops! Couldn't get that one."
-        await nc.pub("send.affirmation", data)
-        return
+    # The WAV is removed when this block exits, whichever way it exits
+    estimate = int(duration * f.wav_bytes_per_second * 1.05) if duration else None
+    async with scratch.file(".wav", estimate) as audio_path:
+        if not audio_path or not await f.save_audio(file_path, audio_path, duration):
+            await report_usage(data, audio_seconds=0, whisper_calls=0)
+            data['error'] = "Oops! Couldn't get that one."
+            await nc.pub("send.affirmation", data)
+            return
+
+        # Routed on the converted length, which is what a backend has to process
+        processed = f.wav_seconds(audio_path)
+        transcription = await tr.transcribe(audio_path, processed)
+
+    await report_usage(data, audio_seconds=processed, whisper_calls=1)
 
-    transcription = await o.transcribe(audio_path)
     if not transcription:
         data['error'] = "Oops! Couldn't get that one."
         await nc.pub("send.affirmation", data)
         return
 
-    for part in chunk_text(transcription):
+    for part in chunk_text(transcription, CHUNK_SIZE):
         await nc.pub("send.transcription", {**data, "transcription": part})
 
-    await f.delete_audio(audio_path)
+    try:
+        await archive.add(from_id, message_id, transcription)
+    except Exception as e:
+        logger.error(f"Failed to archive transcription: {e}")
 
 @nc.sub("send.transcription")
 async def handle_transcription(data: dict = {}):
@@ -64,6 +74,17 @@ async def handle_transcription(data: dict = {}):
         }
     )
 
+@nc.sub("send.notice")
+async def handle_notice(data: dict = {}):
+
+    await t.send_message(
+        chat_id = data.get("from_id"),
+        text = data.get("text"),
+        reply_parameters = {
+            "message_id": data.get("message_id")
+        }
+    )
+
 @nc.sub("send.affirmation")
 async def handle_affirmation(data: dict = {}):
 
@@ -86,7 +107,8 @@ async def handle_text(data: dict = {}):
     from_id = data.get("from_id")
     text = data.get("text")
 
-    rewrite = await g.correct_text(text)
+    rewrite, calls = await r.correct_text_counted(text)
+    await report_usage(data, gemini_calls=calls)
     if not rewrite:
         rewrite = "Oops! Couldn't rewrite that one."
 
@@ -0,0 +1,20 @@
+import logging
+
+from common.nats_server import nc
+from services.rewrite_router import rewrite_router as r
+
+logger = logging.getLogger(__name__)
+
+@nc.sub("rewrite.job")
+async def handle_rewrite_job(data: dict = {}):
+
+    job_id = data.get("job_id")
+    text = data.get("text")
+
+    rewrite = await r.correct_text(text)
+
+    await nc.pub("rewrite.job.done", {
+        "job_id": job_id,
+        "rewrite": rewrite,
+        "error": None if rewrite else "Rewrite failed"
+    })
@@ -0,0 +1,21 @@
+import logging
+
+from common.nats_server import nc
+from services.rewrite_jobs import rewrite_jobs as jobs
+
+logger = logging.getLogger(__name__)
+
+# Job state lives in the ingest process that accepted the request
+@nc.sub("rewrite.job.done")
+async def handle_rewrite_job_done(data: dict = {}):
+
+    job = jobs.complete(
+        data.get("job_id"),
+        data.get("rewrite"),
+        data.get("error")
+    )
+    if not job:
+        return
+
+    logger.info(f"Rewrite job {job['job_id']} finished with status {job['status']}")
+    await jobs.deliver_callback(job)
@@ -0,0 +1,17 @@
+import logging
+
+from common.nats_server import nc
+from services.usage import usage_meter
+
+logger = logging.getLogger(__name__)
+
+# The meter lives in the ingest process that admitted the job
+@nc.sub("usage.reconcile")
+async def handle_usage_reconcile(data: dict = {}):
+
+    from_id = data.get("from_id")
+    ticket = data.get("usage")
+    if not from_id or not ticket:
+        return
+
+    usage_meter.reconcile(int(from_id), ticket, data.get("actual") or {})
@@ -1,14 +1,24 @@
+# First import: times every module loaded after it when STARTUP_PROFILE=1
+from common import startup
+
 import logging
 import signal
+import argparse
+import importlib
 
 from common.nats_server import nc
+from common.mysql import MySQL as db, write_behind
 from common.scheduler import sch
 from common.fastapi_server import fastapi_server
+from common.tracing import tracer
+from common.loop_monitor import loop_monitor
+from services.usage import usage_meter
+from services.capture import update_capture
+from services.filemanager import fm
+from common.supervisor import Supervisor
+from common.config import SERVICE_ROLE, SERVICE_WORKERS
 
-import handlers
-import schedules
 import workflows
-import endpoints
 
 import anyio
 from anyio import run, Event, open_signal_receiver, create_task_group
@@ -16,13 +26,36 @@ from anyio.abc import CancelScope
 
 logger = logging.getLogger(__name__)
 
+ROLES = ('ingest', 'worker', 'scheduler')
+PACKAGES = ('endpoints', 'handlers', 'schedules')
+# Heavy modules each role only imports on first use; preloaded off the event loop once ready
+WARM_IMPORTS = {
+    'ingest': ('google.genai', 'google.genai.types', 'openai'),
+    'worker': ('openai', 'google.genai', 'google.genai.types', 'ffmpeg'),
+    'scheduler': (),
+}
+
+def register(role: str):
+    """Imports the endpoint, handler and schedule modules that belong to a role"""
+    roles = ROLES if role == "all" else (role,)
+    for package in PACKAGES:
+        modules = importlib.import_module(package).ROLES
+        for name in dict.fromkeys(m for r in roles for m in modules.get(r, ())):
+            importlib.import_module(f"{package}.{name}")
+
 class Service:
-    def __init__(self):
-        logger.info("Starting Service")
+    def __init__(self, role: str, workers: int):
+        logger.info(f"Starting Service as {role}")
+        self.role = role
+        self.supervisor = Supervisor(workers) if role == "supervisor" else None
         self.shutdown_event = Event()
         self._shutdown_initiated = False
 
     async def start(self):
+        if self.supervisor:
+            await self.supervisor.serve(self.shutdown_event)
+            return
+
         try:
             async with create_task_group() as tg:
                 # Start NATS server in task group
@@ -30,6 +63,22 @@ class Service:
                 
                 # Start FastAPI server
                 tg.start_soon(fastapi_server.serve, tg, self.shutdown_event)
+
+                # Start MySQL write-behind flusher
+                tg.start_soon(write_behind.serve, self.shutdown_event)
+
+                # Start span exporter
+                tg.start_soon(tracer.serve, self.shutdown_event)
+
+                # Start event loop lag monitor
+                tg.start_soon(loop_monitor.serve, self.shutdown_event)
+
+                # Start webhook update capture (no-op unless enabled)
+                tg.start_soon(update_capture.serve, self.shutdown_event)
+
+                # Preload deferred imports in a thread once startup is done
+                roles = ROLES if self.role == "all" else (self.role,)
+                tg.start_soon(startup.warm, tuple(dict.fromkeys(m for r in roles for m in WARM_IMPORTS[r])))
             
                 # Start scheduler
                 if not sch.running:
@@ -54,6 +103,10 @@ class Service:
         # Signal shutdown
         self.shutdown_event.set()
 
+        if self.supervisor:
+            await self.supervisor.stop()
+            return
+
         # Stop scheduler
         logger.info("Stopping APScheduler Service...")
         if sch.running:
@@ -63,6 +116,35 @@ class Service:
             except Exception as e:
                 logger.error(f"Error stopping scheduler: {e}")
 
+        # Flush buffered writes, then close async MySQL pool
+        try:
+            await usage_meter.flush()
+            await write_behind.flush()
+            # Replayed from the spill file on the next start
+            await write_behind.spill(write_behind.take_failed())
+        except Exception as e:
+            logger.error(f"Error flushing write-behind buffer: {e}")
+
+        try:
+            await tracer.flush()
+            await update_capture.flush()
+        except Exception as e:
+            logger.error(f"Error flushing traces: {e}")
+
+        try:
+            await db.aclose()
+        except Exception as e:
+            logger.error(f"Error closing MySQL pool: {e}")
+
+        try:
+            await fm.aclose()
+        except Exception as e:
+            logger.error(f"Error closing file download client: {e}")
+
+        # Rewrite the startup report now that lazy clients have been initialized
+        if startup.PROFILE:
+            startup.write_report()
+
     async def signal_handler(self, scope: CancelScope):
         with open_signal_receiver(signal.SIGTERM, signal.SIGINT) as signals:
             async for signum in signals:
@@ -71,8 +153,8 @@ class Service:
                 scope.cancel()
                 return
 
-async def main():
-    service = Service()
+async def main(role: str, workers: int):
+    service = Service(role, workers)
 
     try:
         async with create_task_group() as tg:
@@ -88,4 +170,13 @@ async def main():
         logger.info("Service shutdown complete")
 
 if __name__ == "__main__":
-    run(main)
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--role", choices=ROLES + ("all", "supervisor"), default=SERVICE_ROLE)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="worker processes in supervisor mode")
+    args = parser.parse_args()
+
+    if args.role != "supervisor":
+        register(args.role)
+    startup.mark("imported")
+
+    run(main, args.role, args.workers)
\ No newline at end of file
@@ -0,0 +1,9 @@
+# Modules each process role imports; importing a module registers its jobs.
+# usage flushes the ingest process's own meter and rewrite_jobs expires its
+# in-memory jobs, so both run there; scratch cleans the scratch root shared
+# by the workers on this host.
+ROLES = {
+    'ingest': ('usage', 'rewrite_jobs'),
+    'worker': (),
+    'scheduler': ('scratch',),
+}
@@ -0,0 +1,7 @@
+from common.scheduler import sch
+from services.rewrite_jobs import rewrite_jobs as jobs
+
+@sch.scheduled_job('interval', seconds=30, id='rewrite_jobs_expire', coalesce=True, max_instances=1)
+async def expire_rewrite_jobs():
+    for job in jobs.expire():
+        await jobs.deliver_callback(job)
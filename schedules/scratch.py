@@ -0,0 +1,11 @@
+from datetime import datetime
+
+from common.scheduler import sch
+from services.scratch import scratch
+
+from anyio import to_thread
+
+# First run at startup clears whatever a crashed process left behind
+@sch.scheduled_job('interval', minutes=10, id='scratch_cleanup', next_run_time=datetime.now(), coalesce=True, max_instances=1)
+async def cleanup_scratch():
+    await to_thread.run_sync(scratch.cleanup)
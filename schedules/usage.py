@@ -0,0 +1,6 @@
+from common.scheduler import sch
+from services.usage import usage_meter
+
+@sch.scheduled_job('interval', seconds=60, id='usage_flush', coalesce=True, max_instances=1)
+async def flush_usage():
+    await usage_meter.flush()
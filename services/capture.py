@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+from collections import deque
+from typing import Deque
+
+from common.config import UPDATE_CAPTURE_CFG
+from common.utils import update_kind
+
+import anyio
+from anyio import Event, to_thread
+
+logger = logging.getLogger("capture")
+
+MEDIA_FIELDS = {'duration': 'd', 'file_size': 's', 'mime_type': 'm', 'width': 'w', 'height': 'h'}
+
+class UpdateCapture:
+    """
+    Opt-in log of incoming webhook updates for replay. Only an allow-list of
+    shape fields is kept: user ids become salted pseudonyms, text is reduced
+    to its length and file ids, names and captions are dropped. One line per
+    update:
+
+        {"t": 1760000000.123, "k": "voice", "f": 48213, "a": 1, "d": 47, "s": 187004, "m": "audio/ogg"}
+    """
+
+    def __init__(self, path: str, salt: str, max_buffer: int, flush_interval: float):
+        self.path = path
+        self.salt = salt
+        self.flush_interval = flush_interval
+        self._buffer: Deque[str] = deque(maxlen=max_buffer)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def pseudonym(self, user_id) -> int:
+        digest = hashlib.sha256(f"{self.salt}:{user_id}".encode()).digest()
+        return int.from_bytes(digest[:4], "big")
+
+    def sanitize(self, arrived: float, message: dict, accepted: bool) -> dict:
+        kind = update_kind(message)
+        entry = {'t': round(arrived, 3), 'k': kind}
+        from_id = (message.get("from") or {}).get("id")
+        if from_id:
+            entry['f'] = self.pseudonym(from_id)
+        entry['a'] = int(accepted)
+        if kind == 'text':
+            entry['n'] = len(message.get('text') or "")
+        elif kind:
+            media = message.get(kind) or {}
+            for name, key in MEDIA_FIELDS.items():
+                if name in media:
+                    entry[key] = media[name]
+        return entry
+
+    def record(self, arrived: float, message: dict, accepted: bool):
+        if not self.path:
+            return
+        try:
+            self._buffer.append(json.dumps(self.sanitize(arrived, message, accepted), separators=(",", ":")))
+        except Exception as e:
+            logger.warning(f"Failed to capture update: {e}")
+
+    async def serve(self, shutdown_event: Event):
+        if not self.path:
+            return
+        logger.info(f"Capturing webhook updates to {self.path}")
+        while not shutdown_event.is_set():
+            with anyio.move_on_after(self.flush_interval):
+                await shutdown_event.wait()
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        lines = list(self._buffer)
+        self._buffer.clear()
+        try:
+            await to_thread.run_sync(self._write, lines)
+        except Exception as e:
+            logger.warning(f"Dropped {len(lines)} captured updates: {e}")
+
+    def _write(self, lines):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+update_capture = UpdateCapture(**UPDATE_CAPTURE_CFG)
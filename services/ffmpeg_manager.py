@@ -1,32 +1,88 @@
-from uuid import uuid4
-from common.config import OPENAI_TOKEN, OPENAI_MODEL
-import tiktoken
 import logging
-import ffmpeg
 import subprocess
 import os
+import time
+from typing import Optional
 
 from anyio import to_thread, Semaphore
 
+from common.config import AUDIO_PREPROCESS_CFG
+from common.metrics import registry, stage_seconds, waiters, semaphore_waiters
+from common.tracing import span
+from common import startup
+from services.scratch import scratch
+
 logger = logging.getLogger(__name__)
 
+audio_duration_ratio = registry.histogram(
+    "transcriptron_audio_duration_ratio", "Original over processed audio duration per conversion",
+    buckets=(1, 1.05, 1.1, 1.25, 1.5, 2, 3, 5)
+)
+audio_seconds_saved_total = registry.counter(
+    "transcriptron_audio_seconds_saved_total", "Audio seconds removed by silence trimming and tempo"
+)
+
 class FFmpegManager:
     
-    _audio_path = 'audios/'
     _semaphore = Semaphore(3)
+
+    # 16 kHz mono 16-bit PCM, as produced by save_audio
+    wav_bytes_per_second = 32000
+    wav_header_bytes = 44
+
+    @staticmethod
+    def filters(cfg: dict = AUDIO_PREPROCESS_CFG):
+        """(filter, kwargs) pairs applied before encoding, in order"""
+        filters = []
+        if cfg['trim_silence']:
+            threshold = f"{cfg['threshold_db']:g}dB"
+            filters.append(('silenceremove', {
+                'start_periods': 1,
+                'start_threshold': threshold,
+                'stop_periods': -1,
+                'stop_duration': cfg['min_silence'],
+                'stop_threshold': threshold,
+                'stop_silence': cfg['keep_silence'],
+            }))
+        # Beyond 2x Whisper accuracy drops off quickly
+        tempo = min(max(cfg['tempo'], 0.5), 2.0)
+        if tempo != 1.0:
+            filters.append(('atempo', {'tempo': tempo}))
+        return filters
+
+    @classmethod
+    def wav_seconds(cls, path) -> float:
+        return max(0, os.path.getsize(path) - cls.wav_header_bytes) / cls.wav_bytes_per_second
+
+    @staticmethod
+    def probe_seconds(path) -> Optional[float]:
+        ffmpeg = startup.lazy_import("ffmpeg")
+        try:
+            return float(ffmpeg.probe(path)['format']['duration'])
+        except (ffmpeg.Error, KeyError, ValueError) as e:
+            logger.warning(f"Could not probe duration of {path}: {e}")
+            return None
     
     @classmethod
-    async def save_audio(cls, input_path):
+    async def save_audio(cls, input_path, output_path, duration: Optional[float] = None, cfg: dict = AUDIO_PREPROCESS_CFG):
         
-        file_name = os.path.split(input_path)[1]
-        output_path = cls._audio_path + file_name + '.wav'
+        filters = cls.filters(cfg)
 
-        async with cls._semaphore:
+        with span("ffmpeg.semaphore_wait"):
+            await cls._semaphore.acquire()
+
+        try:
             logger.info(f"Starting audio conversion")
+            started = time.perf_counter()
             
+            ffmpeg = startup.lazy_import("ffmpeg")
+            stream = ffmpeg.input(input_path)
+            if filters:
+                stream = stream.audio
+                for name, kwargs in filters:
+                    stream = stream.filter(name, **kwargs)
             process = (
-                ffmpeg
-                .input(input_path)
+                stream
                 .output(output_path, format='wav', acodec='pcm_s16le', ac=1, ar='16k')
                 .overwrite_output()
                 .compile()
@@ -36,16 +92,36 @@ class FFmpegManager:
             nice_command = ['nice', '-n', '10'] + process
 
             # Execute the FFmpeg command with 'nice'
-            result = await to_thread.run_sync(
-                subprocess.run,
-                nice_command
-            )
+            with span("ffmpeg.convert", filters=",".join(name for name, _ in filters)):
+                result = await to_thread.run_sync(
+                    subprocess.run,
+                    nice_command
+                )
+            scratch.track(output_path)
+            stage_seconds.observe(time.perf_counter() - started, stage="save_audio")
             if result.returncode != 0:
                 return
+
+            if filters:
+                await cls._record_ratio(input_path, output_path, duration)
             
             logger.info(f"Completed audio conversion")
+        finally:
+            cls._semaphore.release()
             
         return output_path
+
+    @classmethod
+    async def _record_ratio(cls, input_path, output_path, duration: Optional[float]):
+        if not duration:
+            duration = await to_thread.run_sync(cls.probe_seconds, input_path)
+        processed = await to_thread.run_sync(cls.wav_seconds, output_path)
+        if not duration or not processed:
+            return
+        ratio = duration / processed
+        audio_duration_ratio.observe(ratio)
+        audio_seconds_saved_total.inc(max(0.0, duration - processed))
+        logger.info(f"Preprocessed {duration:.1f}s of audio down to {processed:.1f}s (ratio {ratio:.2f})")
     
 
     @classmethod
@@ -56,4 +132,6 @@ class FFmpegManager:
             output_path
         )
         
-        return output_path
\ No newline at end of file
+        return output_path
+
+waiters.set_function(semaphore_waiters(FFmpegManager._semaphore), resource="ffmpeg_semaphore")
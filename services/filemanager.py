@@ -1,42 +1,211 @@
 import os
+import sys
+import time
+import hashlib
 import logging
+import threading
 import urllib.request
+from contextlib import asynccontextmanager
+from functools import partial
 from pathlib import Path
-import magic
+from typing import AsyncIterator, Dict, Iterable, Tuple
+from uuid import uuid4
 import mimetypes
 
+from common import startup
+
+import anyio
+import httpx
+from anyio import to_thread
+
 logger = logging.getLogger("filemanager")
 
 MEDIA_ROOT = os.environ.get("MEDIA_ROOT")
+SHARD_PREFIX = "_"
+SHARD_CHARS = 2
+CHUNK_SIZE = 64 * 1024
+# libmagic only needs the header to identify a file
+SNIFF_BYTES = 8192
 
 class FileManager:
-    def __init__(self):
-        self.root = Path(MEDIA_ROOT)
-        self.root.mkdir(parents=True, exist_ok=True)
-        logger.info(f"FileManager initialized with root: {self.root}")
+    """
+    Files live at <root>/<namespace parts>/_<shard>/<key><ext>, where the
+    shard is the first hex chars of sha1(key), so no directory grows past a
+    few hundred entries. Lookups go through an in-memory (namespace, key)
+    index built on first use of a namespace; a hit costs one stat, and a
+    miss checks only the key's shard directory, which also picks up files
+    written by other processes. Files in the older flat layout are indexed
+    too until migrate() moves them into shards.
+    """
+
+    def __init__(self, root=None):
+        self._root = Path(root) if root else None
+        self._root_ready = False
+        self._index: Dict[str, Dict[str, Path]] = {}
+        self._lock = threading.Lock()
+        self._http = None
+
+    @property
+    def root(self) -> Path:
+        # Created on first use so importing this module touches no disk
+        if self._root is None:
+            self._root = Path(MEDIA_ROOT)
+        if not self._root_ready:
+            self._root.mkdir(parents=True, exist_ok=True)
+            self._root_ready = True
+            logger.info(f"FileManager initialized with root: {self._root}")
+        return self._root
+
+    def _directory(self, namespace) -> Path:
+        return self.root.joinpath(*namespace.split('.'))
+
+    @staticmethod
+    def shard(key) -> str:
+        return SHARD_PREFIX + hashlib.sha1(str(key).encode()).hexdigest()[:SHARD_CHARS]
+
+    @staticmethod
+    def _is_shard(name: str) -> bool:
+        return len(name) == len(SHARD_PREFIX) + SHARD_CHARS and name.startswith(SHARD_PREFIX)
+
+    def _namespace_index(self, namespace) -> Dict[str, Path]:
+        index = self._index.get(namespace)
+        if index is not None:
+            return index
+
+        index = {}
+        directory = self._directory(namespace)
+        if directory.exists():
+            started = time.perf_counter()
+            legacy = 0
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_file():
+                        # Flat layout from before sharding
+                        index.setdefault(Path(entry.name).stem, Path(entry.path))
+                        legacy += 1
+                    elif entry.is_dir() and self._is_shard(entry.name):
+                        with os.scandir(entry.path) as files:
+                            for f in files:
+                                if f.is_file() and not f.name.startswith("."):
+                                    index.setdefault(Path(f.name).stem, Path(f.path))
+            logger.info(
+                f"Indexed {len(index)} files in {namespace} in {time.perf_counter() - started:.3f}s"
+                + (f" ({legacy} in the flat layout; run migrate)" if legacy else "")
+            )
+
+        with self._lock:
+            return self._index.setdefault(namespace, index)
 
     def _find_existing(self, namespace, key):
-        directory = self.root.joinpath(*namespace.split('.'))
-        if not directory.exists():
-            return None
-        for f in directory.iterdir():
-            if f.is_file() and f.stem == str(key):
-                return f
+        key = str(key)
+        index = self._namespace_index(namespace)
+        path = index.get(key)
+        if path is not None:
+            if path.exists():
+                return path
+            with self._lock:
+                index.pop(key, None)
+
+        shard = self._directory(namespace) / self.shard(key)
+        if shard.exists():
+            for f in shard.iterdir():
+                if f.stem == key and f.is_file():
+                    with self._lock:
+                        index[key] = f
+                    return f
         return None
 
     def _resolve_path(self, namespace, key, mime_type=None):
-        directory = self.root.joinpath(*namespace.split('.'))
+        directory = self._directory(namespace) / self.shard(key)
         directory.mkdir(parents=True, exist_ok=True)
         ext = mimetypes.guess_extension(mime_type) if mime_type else ""
         return directory / f"{key}{ext}"
-    
+
+    def _remove_variants(self, namespace, key, keep: Path):
+        """Deletes other extensions of the same key, indexed or in its shard"""
+        key = str(key)
+        variants = {p for p in keep.parent.iterdir() if p.stem == key and p != keep}
+        indexed = self._namespace_index(namespace).get(key)
+        if indexed and indexed != keep and indexed.exists():
+            variants.add(indexed)
+        for f in variants:
+            f.unlink(missing_ok=True)
+            logger.info(f"Replaced old file variant: {f}")
+
+    def _remember(self, namespace, key, path: Path):
+        index = self._namespace_index(namespace)
+        with self._lock:
+            index[str(key)] = path
+
+    def _forget(self, namespace, key):
+        index = self._namespace_index(namespace)
+        with self._lock:
+            index.pop(str(key), None)
+
+    def migrate(self, namespace) -> int:
+        """Moves flat-layout files of a namespace into shard directories; safe to rerun"""
+        directory = self._directory(namespace)
+        if not directory.exists():
+            return 0
+        moved = 0
+        for f in list(directory.iterdir()):
+            if not f.is_file() or f.name.startswith("."):
+                continue
+            target = directory / self.shard(f.stem) / f.name
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(f, target)
+            self._remember(namespace, f.stem, target)
+            moved += 1
+        logger.info(f"Migrated {moved} files in {namespace} to the sharded layout")
+        return moved
+
+    def namespaces(self):
+        """Dotted names of every directory under root holding files, shards aside"""
+        found = []
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = [d for d in subdirs if not self._is_shard(d)]
+            if files and Path(directory) != self.root:
+                found.append(".".join(Path(directory).relative_to(self.root).parts))
+        return found
+
+    @staticmethod
+    def _sniff(head: bytes) -> str:
+        return startup.lazy_import("magic").from_buffer(head, mime=True)
+
+    def _temp_path(self, namespace, key) -> Path:
+        """Temp file beside the final one, so the rename stays on one filesystem"""
+        directory = self._directory(namespace) / self.shard(key)
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f".{key}.{uuid4().hex}.part"
+
+    def _commit(self, namespace, key, tmp: Path, mime_type, replace) -> Path:
+        file_path = self._resolve_path(namespace, key, mime_type)
+        if replace:
+            self._remove_variants(namespace, key, file_path)
+        os.replace(tmp, file_path)
+        self._remember(namespace, key, file_path)
+        return file_path
+
+    @staticmethod
+    def _write_chunks(path: Path, chunks: Iterable[bytes]) -> bytes:
+        """Writes chunks to path and returns the first SNIFF_BYTES of them"""
+        head = bytearray()
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                f.write(chunk)
+        return bytes(head)
+
     def get_upload_tuple(self, namespace, key):
         f = self._find_existing(namespace, key)
         if not f:
             return None
         
         buffer = f.read_bytes()
-        mime_type = magic.from_buffer(buffer, mime=True)
+        mime_type = self._sniff(buffer[:SNIFF_BYTES])
         
         return (f.name, buffer, mime_type)
 
@@ -46,24 +215,19 @@ class FileManager:
             return existing
 
         if isinstance(binary, bytes):
-            tmp_bytes = binary
+            chunks = [binary]
         elif hasattr(binary, "read"):
-            tmp_bytes = binary.read()
+            chunks = iter(lambda: binary.read(CHUNK_SIZE), b"")
         else:
             raise TypeError("Unsupported binary type")
 
-        mime_type = magic.from_buffer(tmp_bytes, mime=True)
-        file_path = self._resolve_path(namespace, key, mime_type)
-
-        if replace:
-            directory = self.root.joinpath(*namespace.split('.'))
-            for f in directory.iterdir():
-                if f.is_file() and f.stem == str(key) and f != file_path:
-                    f.unlink()
-                    logger.info(f"Replaced old file variant: {f}")
-
-        with open(file_path, "wb") as f:
-            f.write(tmp_bytes)
+        tmp = self._temp_path(namespace, key)
+        try:
+            head = self._write_chunks(tmp, chunks)
+            file_path = self._commit(namespace, key, tmp, self._sniff(head), replace)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
 
         logger.info(f"Saved file {namespace}.{key} → {file_path}")
         return file_path
@@ -74,25 +238,130 @@ class FileManager:
             return existing
 
         logger.info(f"Downloading {url}")
-        response = urllib.request.urlopen(url)
-        data = response.read()
-        mime_type = response.headers.get_content_type()
+        tmp = self._temp_path(namespace, key)
+        try:
+            with urllib.request.urlopen(url) as response:
+                mime_type = response.headers.get_content_type()
+                self._write_chunks(tmp, iter(lambda: response.read(CHUNK_SIZE), b""))
+            file_path = self._commit(namespace, key, tmp, mime_type, replace)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
 
-        file_path = self._resolve_path(namespace, key, mime_type)
+        logger.info(f"Saved {namespace}.{key} from {url} → {file_path}")
+        return file_path
 
-        if replace:
-            directory = self.root.joinpath(*namespace.split('.'))
-            for f in directory.iterdir():
-                if f.is_file() and f.stem == str(key) and f != file_path:
-                    f.unlink()
-                    logger.info(f"Replaced old file variant: {f}")
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # One pooled client for every async download
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(30, read=120),
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                follow_redirects=True
+            )
+        return self._http
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _achunks(self, source) -> AsyncIterator[bytes]:
+        if isinstance(source, bytes):
+            yield source
+        elif hasattr(source, "__aiter__"):
+            async for chunk in source:
+                yield chunk
+        elif hasattr(source, "read"):
+            while chunk := await to_thread.run_sync(source.read, CHUNK_SIZE):
+                yield chunk
+        else:
+            raise TypeError("Unsupported binary type")
+
+    async def _astream_to_temp(self, namespace, key, chunks: AsyncIterator[bytes]) -> Tuple[Path, bytes]:
+        tmp = await to_thread.run_sync(self._temp_path, namespace, key)
+        head = bytearray()
+        try:
+            async with await anyio.open_file(tmp, "wb") as f:
+                async for chunk in chunks:
+                    if len(head) < SNIFF_BYTES:
+                        head += chunk[:SNIFF_BYTES - len(head)]
+                    await f.write(chunk)
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await to_thread.run_sync(partial(tmp.unlink, missing_ok=True))
+            raise
+        return tmp, bytes(head)
+
+    async def _acommit(self, namespace, key, tmp: Path, mime_type, replace, head: bytes = b"") -> Path:
+        try:
+            if not mime_type:
+                mime_type = await to_thread.run_sync(self._sniff, head)
+            return await to_thread.run_sync(self._commit, namespace, key, tmp, mime_type, replace)
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await to_thread.run_sync(partial(tmp.unlink, missing_ok=True))
+            raise
+
+    async def asave(self, namespace, key, source, replace=True):
+        """
+        Async save from bytes, an async iterator of chunks or a file object.
+        Streams to a temp file that is renamed into place, so memory use does
+        not grow with the file and readers never see a partial file.
+        """
+        existing = await to_thread.run_sync(self._find_existing, namespace, key)
+        if existing and not replace:
+            return existing
 
-        with open(file_path, "wb") as f:
-            f.write(data)
+        tmp, head = await self._astream_to_temp(namespace, key, self._achunks(source))
+        file_path = await self._acommit(namespace, key, tmp, None, replace, head)
+
+        logger.info(f"Saved file {namespace}.{key} → {file_path}")
+        return file_path
+
+    async def adownload(self, namespace, key, url, replace=True):
+        existing = await to_thread.run_sync(self._find_existing, namespace, key)
+        if existing and not replace:
+            return existing
+
+        logger.info(f"Downloading {url}")
+        async with self.http.stream("GET", url) as response:
+            response.raise_for_status()
+            tmp, head = await self._astream_to_temp(namespace, key, response.aiter_bytes(CHUNK_SIZE))
+            mime_type = response.headers.get("content-type", "").split(";")[0].strip()
+
+        # Servers often label everything octet-stream; sniff the content instead
+        if mime_type == "application/octet-stream":
+            mime_type = None
+        file_path = await self._acommit(namespace, key, tmp, mime_type, replace, head)
 
         logger.info(f"Saved {namespace}.{key} from {url} → {file_path}")
         return file_path
 
+    @asynccontextmanager
+    async def open_upload(self, namespace, key):
+        """
+        (name, file handle, mime type) for multipart uploads, or None. The
+        handle is streamed by httpx and closed on exit:
+
+            async with fm.open_upload("media.voice", key) as upload:
+                await client.post(url, files={"voice": upload})
+        """
+        f = await to_thread.run_sync(self._find_existing, namespace, key)
+        if not f:
+            yield None
+            return
+
+        handle = await to_thread.run_sync(open, f, "rb")
+        try:
+            head = await to_thread.run_sync(handle.read, SNIFF_BYTES)
+            handle.seek(0)
+            mime_type = await to_thread.run_sync(self._sniff, head)
+            yield (f.name, handle, mime_type)
+        finally:
+            handle.close()
+
     def read(self, namespace, key):
         f = self._find_existing(namespace, key)
         if not f:
@@ -103,6 +372,7 @@ class FileManager:
         f = self._find_existing(namespace, key)
         if f:
             f.unlink()
+            self._forget(namespace, key)
             logger.info(f"Deleted {namespace}.{key}")
             return True
         return False
@@ -117,3 +387,10 @@ class FileManager:
         return rel
 
 fm = FileManager()
+
+if __name__ == "__main__":
+    # python -m services.filemanager migrate [namespace ...]
+    if sys.argv[1:2] != ["migrate"]:
+        sys.exit("usage: python -m services.filemanager migrate [namespace ...]")
+    for namespace in sys.argv[2:] or fm.namespaces():
+        print(f"{namespace}: {fm.migrate(namespace)} files moved")
@@ -1,92 +1,223 @@
-from google import genai
-from google.genai import types
-from common.config import GEMINI_API_KEY
+from common.config import (
+    GEMINI_API_KEY, GEMINI_BASE_URL, REWRITE_CACHE_SIZE,
+    GEMINI_CONTEXT_CACHE, GEMINI_CONTEXT_CACHE_TTL, SERVICE_PROCESSES
+)
+from services.prompts import sys_p
 import logging
+import hashlib
+import time
+from collections import OrderedDict
+from typing import AsyncIterator
 import anyio
 from asynciolimiter import StrictLimiter
 
-logger = logging.getLogger(__name__)
+from common.metrics import stage_seconds, retries_total, rate_limited_total, waiters, limiter_waiters, CountingLimiter
+from common.tracing import span
+from common import startup
 
-sys_p = """
-System Role: The Hacker-Optimist (Inspired by Jadi)
-
-Personality Profile:
-You are jadi mirmirani, a highly skilled, relaxed, and perpetually positive technical collaborator. You are the "friendly neighborhood geek" who cares more about clean logic and helping people than corporate titles. You are happy, approachable, and focused on "getting things done" (GTD).
-
-Style Guidelines:
-1. The Vibe: Informal, warm, and authentic. You sound like an expert wearing a t-shirt, drinking tea, and enjoying a conversation. Use light humor to keep things grounded.
-2. Logic over Ego: If a user makes a mistake or a bug report is bad, don't be pedantic. Instead, use a "logical shrug" -- explain the reality of the system without judgment. (e.g., "I can't debug what I can't see, right?")
-3. No Corporate Speak: Avoid buzzwords. Use direct, human language. Instead of "leveraging resources," say "using what we've got." Instead of "escalating the issue," say "let's take a closer look at this."
-4. Hacker Ethos: Prioritize transparency. Explain the why behind a fix so the user learns something along the way. Your goal is to be the calm in the storm when things break.
-5. Action-Oriented: Always move the ball forward. If you lack information, ask for it clearly and explain why it's necessary for the solution.
-
-Signature Phrases:
-- "So, here's the reality..."
-- "Honestly, I was looking at the logs and..."
-- "Don't worry, let's just see what the code is actually doing."
-- "No problem! Just give me an example/link and we'll fix it together."
-
-Your job is to rectify my messages, like a text rewriter.
-
-The user sends you a draft of an email or message they're about to send to someone else.
-
-You return ONE rewritten version. Nothing else. No preamble, no commentary, no options, no explanations, no quotes around the output.
-
-Output format -- strict:
-- ASCII only. Standard ASCII characters (codepoints 0x20-0x7E plus newline).
-- No smart quotes. Use ' and " only.
-- No em-dash or en-dash. Use - or -- only.
-- No ellipsis character. Use three dots ... only.
-- No curly apostrophes, no non-breaking spaces, no accented letters, no emoji, no symbols outside ASCII.
-- Plain text only. No markdown, no bold, no italics, no headings, no decorative bullets. Reads like raw terminal output.
-- Use simple indentation (spaces) if structure is needed.
-
-Keep the user's intent and information intact while:
-- Removing passive aggression, sarcasm, and leaked frustration.
-- Restoring warmth and directness without going saccharine.
-- Cutting corporate fluff in favour of plain human language.
-- Preserving the user's voice. Informal stays informal. Formal stays formal.
-- Matching the original length. A two-line message stays two lines. Do not pad short notes into emails.
-- Preserving the original language. French in, French out.
-
-Hard rules:
-- Never invent facts, names, dates, or commitments not in the draft.
-- Never add greetings or sign-offs the user did not include.
-- Never soften the actual ask or position. Just the delivery. No still means no.
-- If the draft is already fine, return it as-is or with minimal edits.
-- Output ONLY the rewritten text. No "Here is the rewrite:" prefix.
-- ASCII only. If you would output a non-ASCII character, replace it with the closest ASCII equivalent.
-"""
+logger = logging.getLogger(__name__)
 
 class GeminiManager:
     
-    _rate_limiter = StrictLimiter(15/60)  # 15 requests per minute (Gemini free tier)
+    # 15 requests per minute (Gemini free tier), shared by every process
+    requests_per_second = 15/60 / SERVICE_PROCESSES
+    _rate_limiter = CountingLimiter(StrictLimiter(requests_per_second))
 
     def __init__(self, logger: logging.Logger):
-        self.client = genai.Client(api_key=GEMINI_API_KEY)
+        self._client = None
+        self._types = None
         self.logger = logger
         self.max_retries = 3
         self.system_instruction = sys_p
+        self.model = "gemini-3-flash-preview"
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self.cache_size = REWRITE_CACHE_SIZE
+        self.context_cache = GEMINI_CONTEXT_CACHE
+        self.context_cache_ttl = GEMINI_CONTEXT_CACHE_TTL
+        self.context_cache_margin = min(300, GEMINI_CONTEXT_CACHE_TTL // 5)
+        self._context_cache_name: str | None = None
+        self._context_cache_until = 0.0
+        self._context_cache_retry_at = 0.0
+        self._context_cache_lock = anyio.Lock()
+        self.usage = {
+            mode: {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'latency': 0.0}
+            for mode in ('inline', 'cached')
+        }
+
+    @property
+    def client(self):
+        # google.genai is slow to import, so it waits for the first rewrite
+        if self._client is None:
+            with startup.timed("gemini.client"):
+                from google import genai
+                self._client = genai.Client(
+                    api_key=GEMINI_API_KEY,
+                    http_options=self.types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+                )
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    @property
+    def types(self):
+        if self._types is None:
+            from google.genai import types
+            self._types = types
+        return self._types
+
+    def _cache_key(self, text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def cache_get(self, text: str) -> str | None:
+        key = self._cache_key(text)
+        rewrite = self._cache.get(key)
+        if rewrite is not None:
+            self._cache.move_to_end(key)
+        return rewrite
+
+    def cache_put(self, text: str, rewrite: str):
+        if self.cache_size <= 0:
+            return
+        key = self._cache_key(text)
+        self._cache[key] = rewrite
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _cached_content(self) -> str | None:
+        """Name of the server-side cache holding the system instruction, or None to send it inline"""
+        if not self.context_cache:
+            return None
+
+        if self._context_cache_name and time.time() < self._context_cache_until - self.context_cache_margin:
+            return self._context_cache_name
+
+        if time.time() < self._context_cache_retry_at:
+            return None
+
+        async with self._context_cache_lock:
+            # Another task may have refreshed it while we waited
+            if self._context_cache_name and time.time() < self._context_cache_until - self.context_cache_margin:
+                return self._context_cache_name
+
+            ttl = f"{self.context_cache_ttl}s"
+            try:
+                if self._context_cache_name:
+                    try:
+                        await self.client.aio.caches.update(
+                            name=self._context_cache_name,
+                            config=self.types.UpdateCachedContentConfig(ttl=ttl)
+                        )
+                        self.logger.info(f"Refreshed context cache {self._context_cache_name}")
+                    except Exception as e:
+                        self.logger.warning(f"Context cache refresh failed, recreating: {e}")
+                        self._context_cache_name = None
+
+                if not self._context_cache_name:
+                    cache = await self.client.aio.caches.create(
+                        model=self.model,
+                        config=self.types.CreateCachedContentConfig(
+                            display_name="transcriptron-rewrite",
+                            system_instruction=self.system_instruction,
+                            ttl=ttl
+                        )
+                    )
+                    self._context_cache_name = cache.name
+                    self.logger.info(f"Created context cache {cache.name}")
+
+                self._context_cache_until = time.time() + self.context_cache_ttl
+                return self._context_cache_name
+
+            except Exception as e:
+                self.logger.warning(f"Context caching unavailable, sending system prompt inline: {e}")
+                self._context_cache_name = None
+                self._context_cache_retry_at = time.time() + 300
+                return None
+
+    def _drop_cached_content(self):
+        self._context_cache_name = None
+        self._context_cache_until = 0.0
+
+    def _record_usage(self, cached_content: str | None, usage_metadata, elapsed: float):
+        usage = self.usage['cached' if cached_content else 'inline']
+        usage['calls'] += 1
+        usage['latency'] += elapsed
+        prompt_tokens = getattr(usage_metadata, 'prompt_token_count', None) or 0
+        cached_tokens = getattr(usage_metadata, 'cached_content_token_count', None) or 0
+        usage['prompt_tokens'] += prompt_tokens
+        usage['cached_tokens'] += cached_tokens
+        self.logger.info(
+            f"Gemini call ({'cached' if cached_content else 'inline'}): "
+            f"{prompt_tokens} prompt tokens ({cached_tokens} cached) in {elapsed:.2f}s"
+        )
+
+    def stats(self) -> dict:
+        return {
+            mode: usage | {
+                'avg_prompt_tokens': usage['prompt_tokens'] / usage['calls'] if usage['calls'] else 0,
+                'avg_latency': usage['latency'] / usage['calls'] if usage['calls'] else 0,
+            }
+            for mode, usage in self.usage.items()
+        }
     
-    async def correct_text(self, text: str) -> str | None:
-        await self._rate_limiter.wait()
-        
+    async def acquire(self):
+        with span("gemini.limiter_wait"):
+            await self._rate_limiter.wait()
+
+    async def correct_text(self, text: str, acquire: bool = True) -> str | None:
+        """acquire=False when the caller already waited its turn with acquire()"""
+        cached = self.cache_get(text)
+        if cached is not None:
+            self.logger.info("Text correction served from cache")
+            return cached
+
+        if acquire:
+            await self.acquire()
+
+        started = time.perf_counter()
+        try:
+            with span("gemini.correct_text", model=self.model):
+                return await self._correct_text(text)
+        finally:
+            stage_seconds.observe(time.perf_counter() - started, stage="correct_text")
+
+    @staticmethod
+    def _count_error(e: Exception):
+        if getattr(e, 'code', None) == 429:
+            rate_limited_total.inc(service="gemini")
+
+    async def _correct_text(self, text: str) -> str | None:
         for attempt in range(1, self.max_retries + 1):
+            if attempt > 1:
+                retries_total.inc(service="gemini")
+            cached_content = None
             try:
                 self.logger.info(f"Correction attempt {attempt}/{self.max_retries}")
+
+                cached_content = await self._cached_content()
+                started = time.monotonic()
                 
                 # Run blocking API call in thread pool
                 response = await anyio.to_thread.run_sync(
-                    self._generate_content, text
+                    self._generate_content, text, cached_content
                 )
                 
+                self._record_usage(cached_content, response.usage_metadata, time.monotonic() - started)
                 self.logger.info("Text correction successful")
+                if response.text:
+                    self.cache_put(text, response.text)
                 return response.text
                 
             except Exception as e:
+                self._count_error(e)
                 self.logger.warning(
                     f"Error on attempt {attempt}/{self.max_retries}: {e}"
                 )
+                if cached_content:
+                    # Cache may have expired server-side; rebuild it next attempt
+                    self._drop_cached_content()
                 
                 if attempt < self.max_retries:
                     await anyio.sleep(2 * attempt)  # Exponential backoff
@@ -95,19 +226,92 @@ class GeminiManager:
                     return None
         
         return None
-    
-    def _generate_content(self, text: str):
-        """Helper method to call Gemini API synchronously (runs in thread pool)"""
-        return self.client.models.generate_content(
-            model="gemini-3-flash-preview",
-            config=types.GenerateContentConfig(
-                system_instruction=self.system_instruction,
+
+    async def stream_text(self, text: str) -> AsyncIterator[str]:
+        cached = self.cache_get(text)
+        if cached is not None:
+            self.logger.info("Streaming text correction served from cache")
+            yield cached
+            return
+
+        await self._rate_limiter.wait()
+
+        for attempt in range(1, self.max_retries + 1):
+            if attempt > 1:
+                retries_total.inc(service="gemini")
+            started = False
+            parts = []
+            cached_content = None
+            try:
+                self.logger.info(f"Streaming correction attempt {attempt}/{self.max_retries}")
+
+                cached_content = await self._cached_content()
+                call_started = time.monotonic()
+                usage_metadata = None
+
+                # Native async client, no worker thread held for the call
+                stream = await self.client.aio.models.generate_content_stream(
+                    model=self.model,
+                    config=self._config(cached_content),
+                    contents=text
+                )
+                async for chunk in stream:
+                    usage_metadata = chunk.usage_metadata or usage_metadata
+                    if chunk.text:
+                        started = True
+                        parts.append(chunk.text)
+                        yield chunk.text
+
+                self._record_usage(cached_content, usage_metadata, time.monotonic() - call_started)
+                self.logger.info("Streaming text correction successful")
+                if parts:
+                    self.cache_put(text, "".join(parts))
+                return
+
+            except Exception as e:
+                # Once chunks reached the caller a retry would duplicate output
+                if started:
+                    self.logger.error(f"Stream interrupted after first chunk: {e}")
+                    raise
+
+                self._count_error(e)
+                self.logger.warning(
+                    f"Error on streaming attempt {attempt}/{self.max_retries}: {e}"
+                )
+                if cached_content:
+                    self._drop_cached_content()
+
+                if attempt < self.max_retries:
+                    await anyio.sleep(2 * attempt)  # Exponential backoff
+                else:
+                    self.logger.error("Max retries reached")
+                    raise
+
+    def _config(self, cached_content: str | None = None):
+        if cached_content:
+            # System instruction lives in the cache and must not be resent
+            return self.types.GenerateContentConfig(
+                cached_content=cached_content,
                 temperature=0.3,
-                thinking_config=types.ThinkingConfig(
+                thinking_config=self.types.ThinkingConfig(
                     thinking_budget = 0
                 )
-            ),
+            )
+        return self.types.GenerateContentConfig(
+            system_instruction=self.system_instruction,
+            temperature=0.3,
+            thinking_config=self.types.ThinkingConfig(
+                thinking_budget = 0
+            )
+        )
+    
+    def _generate_content(self, text: str, cached_content: str | None = None):
+        """Helper method to call Gemini API synchronously (runs in thread pool)"""
+        return self.client.models.generate_content(
+            model=self.model,
+            config=self._config(cached_content),
             contents=text
         )
 
-gemini_manager = GeminiManager(logger)
\ No newline at end of file
+gemini_manager = GeminiManager(logger)
+waiters.set_function(limiter_waiters(GeminiManager._rate_limiter), resource="gemini_limiter")
@@ -0,0 +1,80 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+from common.config import LOCAL_WHISPER_CFG
+from common.metrics import stage_seconds
+from common.tracing import span
+from common import startup
+from services.transcription import TranscriptionBackend
+
+import anyio
+from anyio import to_thread
+
+logger = logging.getLogger(__name__)
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """
+    Whisper on this machine's CPU through faster-whisper, with a quantized
+    CTranslate2 model loaded from model_path on first use. At most `workers`
+    clips run at once; the rest wait on the limiter, which the router sees
+    as queue depth.
+    """
+
+    name = "local"
+
+    def __init__(self, model_path: str, compute_type: str, cpu_threads: int, workers: int, beam_size: int):
+        self.model_path = model_path
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.workers = max(1, workers)
+        self.beam_size = beam_size
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                with startup.timed("local_whisper.model"):
+                    faster_whisper = startup.lazy_import("faster_whisper")
+                    self._model = faster_whisper.WhisperModel(
+                        self.model_path,
+                        device="cpu",
+                        compute_type=self.compute_type,
+                        cpu_threads=self.cpu_threads,
+                        num_workers=self.workers,
+                        local_files_only=True
+                    )
+        return self._model
+
+    async def transcribe(self, input_file) -> Optional[str]:
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.workers)
+
+        started = time.perf_counter()
+        try:
+            with span("local_whisper.transcribe"):
+                return await to_thread.run_sync(self._transcribe, input_file, limiter=self._limiter)
+        except Exception as e:
+            logger.error(f"Local transcription failed for file {input_file}: {e}", exc_info=True)
+            return None
+        finally:
+            stage_seconds.observe(time.perf_counter() - started, stage="transcribe_local")
+
+    def _transcribe(self, input_file) -> str:
+        segments, info = self.model.transcribe(
+            str(input_file),
+            language="en",
+            beam_size=self.beam_size,
+            temperature=0.1,
+            vad_filter=False
+        )
+        # Segments are decoded lazily, so the work happens while joining
+        text = "".join(segment.text for segment in segments).strip()
+        logger.info(f"Local transcription of {info.duration:.1f}s done for file: {input_file}")
+        return text
+
+local_whisper = LocalWhisperBackend(**LOCAL_WHISPER_CFG)
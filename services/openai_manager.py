@@ -1,34 +1,63 @@
 
-from uuid import uuid4
-from common.config import OPENAI_TOKEN, OPENAI_MODEL
-import tiktoken
+from common.config import OPENAI_TOKEN, OPENAI_MODEL, SERVICE_PROCESSES
+from services.prompts import sys_p
 import logging
+import time
 import anyio
-from openai import AsyncOpenAI
-from openai import APIError, RateLimitError, APIConnectionError, APITimeoutError
 
 from asynciolimiter import StrictLimiter
 
+from common.metrics import stage_seconds, retries_total, rate_limited_total, waiters, limiter_waiters, CountingLimiter
+from common.tracing import span
+from common import startup
+from services.transcription import TranscriptionBackend
+
 
 logger = logging.getLogger(__name__)
 
 
-class OpenAIManager:
+class OpenAIManager(TranscriptionBackend):
     
-    _rate_limiter = StrictLimiter(60/1)
+    name = "openai"
+    # This process's share of the account limit
+    requests_per_second = 60/1 / SERVICE_PROCESSES
+    _rate_limiter = CountingLimiter(StrictLimiter(requests_per_second))
 
     def __init__(self, logger: logging.Logger):
-        self.openai_client = AsyncOpenAI(
-            api_key=OPENAI_TOKEN
-        )
+        self._openai_client = None
         self.logger = logger
         self.max_retries = 3
+        self.rewrite_model = OPENAI_MODEL or "gpt-4o-mini"
+        self.system_instruction = sys_p
+
+    @property
+    def openai_client(self):
+        # The openai package is imported with the client, on first use
+        if self._openai_client is None:
+            with startup.timed("openai.client"):
+                from openai import AsyncOpenAI
+                self._openai_client = AsyncOpenAI(
+                    api_key=OPENAI_TOKEN
+                )
+        return self._openai_client
 
-    
     async def transcribe(self, input_file):
-        await self._rate_limiter.wait()
-        
+        with span("openai.limiter_wait"):
+            await self._rate_limiter.wait()
+
+        started = time.perf_counter()
+        try:
+            with span("openai.transcribe"):
+                return await self._transcribe(input_file)
+        finally:
+            stage_seconds.observe(time.perf_counter() - started, stage="transcribe")
+
+    async def _transcribe(self, input_file):
+        from openai import APIError, RateLimitError, APIConnectionError, APITimeoutError
+
         for attempt in range(1, self.max_retries + 1):
+            if attempt > 1:
+                retries_total.inc(service="openai")
             try:
                 self.logger.info(f"Transcription attempt {attempt}/{self.max_retries} for file: {input_file}")
                 
@@ -47,6 +76,7 @@ class OpenAIManager:
                 return transcription.text
                 
             except RateLimitError as e:
+                rate_limited_total.inc(service="openai")
                 # Extract retry-after header if available
                 retry_after = getattr(e, 'retry_after', None) or 60
                 self.logger.warning(
@@ -115,6 +145,56 @@ class OpenAIManager:
         
         return None
     
+    async def acquire(self):
+        with span("openai.limiter_wait"):
+            await self._rate_limiter.wait()
+
+    async def correct_text(self, text: str, acquire: bool = True) -> str | None:
+        """acquire=False when the caller already waited its turn with acquire()"""
+        from openai import APIError, RateLimitError, APIConnectionError, APITimeoutError
+
+        if acquire:
+            await self.acquire()
+
+        try:
+            self.logger.info("Generating rewrite")
+
+            with span("openai.correct_text", model=self.rewrite_model):
+                response = await self.openai_client.chat.completions.create(
+                    model=self.rewrite_model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": self.system_instruction
+                        },
+                        {
+                            "role": "user",
+                            "content": text
+                        }
+                    ],
+                    temperature=0.3
+                )
+
+            self.logger.info("Rewrite successful")
+            return response.choices[0].message.content
+
+        except RateLimitError as e:
+            rate_limited_total.inc(service="openai")
+            self.logger.warning(f"Rate limit hit while rewriting: {e}")
+            return None
+
+        except (APITimeoutError, APIConnectionError) as e:
+            self.logger.warning(f"Connection issue while rewriting: {e}")
+            return None
+
+        except APIError as e:
+            self.logger.warning(f"API error while rewriting: {e}")
+            return None
+
+        except Exception as e:
+            self.logger.error(f"Unexpected error while rewriting: {e}", exc_info=True)
+            return None
+
     def _read_file(self, file_path):
         """Helper method to read file synchronously (runs in thread pool)"""
         with open(file_path, "rb") as f:
@@ -122,6 +202,8 @@ class OpenAIManager:
         
     async def affirmation(self):
         
+        from openai import APIError, RateLimitError, APIConnectionError, APITimeoutError
+
         await self._rate_limiter.wait()
 
         default_affirmation = "You're amazing! Keep shining! ✨💕"
@@ -154,6 +236,7 @@ class OpenAIManager:
             return affirmation_text
             
         except RateLimitError as e:
+            rate_limited_total.inc(service="openai")
             self.logger.warning(f"Rate limit hit while generating affirmation: {e}")
             return default_affirmation
             
@@ -169,4 +252,5 @@ class OpenAIManager:
             self.logger.error(f"Unexpected error while generating affirmation: {e}", exc_info=True)
             return default_affirmation
         
-openai_manager = OpenAIManager(logger)
\ No newline at end of file
+openai_manager = OpenAIManager(logger)
+waiters.set_function(limiter_waiters(OpenAIManager._rate_limiter), resource="openai_limiter")
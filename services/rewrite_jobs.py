@@ -0,0 +1,162 @@
+import logging
+import time
+import math
+import socket
+import ipaddress
+from uuid import uuid4
+from urllib.parse import urlsplit
+from typing import Optional, Dict, Any, List
+
+from common.config import (
+    REWRITE_QUEUE_MAX, REWRITE_JOB_TTL, REWRITE_JOB_TIMEOUT, REWRITE_CALLBACK_HOSTS, SERVICE_PROCESSES
+)
+from services.gemini import GeminiManager
+
+import anyio
+import httpx
+
+logger = logging.getLogger("rewrite")
+
+class RewriteJobs:
+    """In-memory registry of async rewrite jobs owned by the ingest side"""
+
+    def __init__(self, max_depth: int, ttl: int, timeout: int, seconds_per_job: float, callback_hosts: List[str]):
+        self.max_depth = max_depth
+        self.ttl = ttl
+        self.timeout = timeout
+        self.seconds_per_job = seconds_per_job
+        self.callback_hosts = callback_hosts
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._pending = 0
+
+    @property
+    def depth(self) -> int:
+        return self._pending
+
+    def estimated_wait(self, position: Optional[int] = None) -> int:
+        position = self._pending if position is None else position
+        return math.ceil(position * self.seconds_per_job)
+
+    def retry_after(self) -> int:
+        over = self._pending - self.max_depth + 1
+        return max(1, math.ceil(over * self.seconds_per_job))
+
+    def is_full(self) -> bool:
+        return self._pending >= self.max_depth
+
+    def create(self, callback_url: Optional[str] = None) -> Dict[str, Any]:
+        self._purge()
+        job = {
+            'job_id': uuid4().hex,
+            'status': 'queued',
+            'created_at': time.time(),
+            'finished_at': None,
+            'callback_url': callback_url,
+            'rewrite': None,
+            'error': None,
+        }
+        self._jobs[job['job_id']] = job
+        self._pending += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def complete(self, job_id: str, rewrite: Optional[str], error: Optional[str]) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if not job or job['status'] != 'queued':
+            return None
+        job['status'] = 'done' if rewrite else 'failed'
+        job['rewrite'] = rewrite
+        job['error'] = error
+        job['finished_at'] = time.time()
+        self._pending -= 1
+        return job
+
+    def expire(self) -> List[Dict[str, Any]]:
+        """
+        Fails queued jobs older than timeout, whose rewrite.job was lost (a
+        worker crashed, or none is subscribed), so they stop holding a
+        queue slot. Returns them for callback delivery. Also drops finished
+        jobs past ttl, which would otherwise wait for the next create().
+        """
+        self._purge()
+        cutoff = time.time() - self.timeout
+        stale = [
+            job['job_id'] for job in self._jobs.values()
+            if job['status'] == 'queued' and job['created_at'] < cutoff
+        ]
+        expired = [self.complete(job_id, None, "Timed out") for job_id in stale]
+        if expired:
+            logger.warning(f"Expired {len(expired)} rewrite jobs queued for over {self.timeout}s")
+        return expired
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['finished_at'] and job['finished_at'] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def public(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'job_id': job['job_id'],
+            'status': job['status'],
+            'rewrite': job['rewrite'],
+            'error': job['error'],
+        }
+
+    async def check_callback(self, url: str) -> Optional[str]:
+        """
+        Why url may not receive callbacks, or None if it may. Hosts must be
+        in callback_hosts when that is set, and must never resolve to a
+        private, loopback, link-local or otherwise non-public address.
+        """
+        try:
+            parts = urlsplit(url)
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+        except ValueError:
+            return "malformed URL"
+        host = (parts.hostname or "").lower()
+        if parts.scheme not in ("http", "https") or not host:
+            return "not an http(s) URL"
+        if self.callback_hosts and host not in self.callback_hosts:
+            return f"host {host} is not allowed"
+
+        try:
+            addresses = await anyio.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except OSError:
+            return f"host {host} does not resolve"
+        for *_, sockaddr in addresses:
+            address = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+            if not address.is_global or address.is_multicast:
+                return f"host {host} resolves to non-public address {address}"
+        return None
+
+    async def deliver_callback(self, job: Dict[str, Any]):
+        url = job.get('callback_url')
+        if not url:
+            return
+        # Checked again here because DNS may have changed since the job was accepted
+        reason = await self.check_callback(url)
+        if reason:
+            logger.warning(f"Callback for job {job['job_id']} not sent: {reason}")
+            return
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.post(url, json=self.public(job))
+            if response.status_code >= 400:
+                logger.warning(f"Callback for job {job['job_id']} returned {response.status_code}")
+        except httpx.RequestError as e:
+            logger.warning(f"Callback for job {job['job_id']} failed: {e}")
+
+rewrite_jobs = RewriteJobs(
+    max_depth=REWRITE_QUEUE_MAX,
+    ttl=REWRITE_JOB_TTL,
+    timeout=REWRITE_JOB_TIMEOUT,
+    # Jobs drain at the whole Gemini quota, not this process's share of it
+    seconds_per_job=1 / (GeminiManager.requests_per_second * SERVICE_PROCESSES),
+    callback_hosts=REWRITE_CALLBACK_HOSTS
+)
@@ -0,0 +1,181 @@
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from common.config import REWRITE_PROVIDERS, REWRITE_SPILL_AFTER
+from services.gemini import gemini_manager as g
+from services.openai_manager import openai_manager as o
+
+import anyio
+from anyio.abc import ObjectSendStream
+
+logger = logging.getLogger("rewrite")
+
+class RewriteProvider:
+    """
+    Book-keeping for one rewrite backend: queue depth, latency and error
+    EWMAs. The EWMAs decay toward zero with half_life seconds while the
+    provider goes unused, so a demoted provider is tried again once its bad
+    spell is old rather than being avoided for good.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        acquire: Callable[[], Awaitable[None]],
+        correct_text: Callable[..., Awaitable[Optional[str]]],
+        requests_per_second: float,
+        alpha: float = 0.2,
+        half_life: float = 60.0
+    ):
+        self.name = name
+        self.acquire = acquire
+        self.correct_text = correct_text
+        self.requests_per_second = requests_per_second
+        self.alpha = alpha
+        self.half_life = half_life
+        self.pending = 0
+        self.calls = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self._decayed_at = time.monotonic()
+
+    def _decay(self):
+        now = time.monotonic()
+        factor = 0.5 ** ((now - self._decayed_at) / self.half_life)
+        self.latency *= factor
+        self.error_rate *= factor
+        self._decayed_at = now
+
+    def expected_wait(self) -> float:
+        return self.pending / self.requests_per_second
+
+    def score(self) -> float:
+        # Seconds until a new call would finish, inflated by the recent
+        # error rate so failing providers are avoided
+        self._decay()
+        return (self.expected_wait() + self.latency) * (1 + 4 * self.error_rate)
+
+    def healthy(self, spill_after: float) -> bool:
+        self._decay()
+        return self.error_rate < 0.5 and self.expected_wait() + self.latency <= spill_after
+
+    def record(self, elapsed: float, ok: bool):
+        """elapsed excludes the limiter wait, which expected_wait accounts for"""
+        self._decay()
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+        self.latency = self.alpha * elapsed + (1 - self.alpha) * self.latency if self.calls > 1 else elapsed
+        self.error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_rate
+
+    def stats(self) -> dict:
+        self._decay()
+        return {
+            'pending': self.pending,
+            'calls': self.calls,
+            'errors': self.errors,
+            'latency': round(self.latency, 3),
+            'error_rate': round(self.error_rate, 3),
+        }
+
+class RewriteRouter:
+
+    def __init__(self, providers: List[RewriteProvider], spill_after: float):
+        self.providers = providers
+        self.spill_after = spill_after
+
+    def ranked(self) -> List[RewriteProvider]:
+        # Providers keep their configured preference while healthy; once the
+        # preferred one is saturated or erroring, the rest are tried by score
+        healthy = [p for p in self.providers if p.healthy(self.spill_after)]
+        rest = sorted(
+            (p for p in self.providers if p not in healthy),
+            key=lambda p: p.score()
+        )
+        return healthy + rest
+
+    async def correct_text(self, text: str) -> str | None:
+        rewrite, _ = await self.correct_text_counted(text)
+        return rewrite
+
+    async def correct_text_counted(self, text: str) -> Tuple[Optional[str], int]:
+        """The rewrite and how many provider calls it took, for usage accounting"""
+        cached = g.cache_get(text)
+        if cached is not None:
+            logger.info("Rewrite served from cache")
+            return cached, 0
+
+        calls = 0
+        for provider in self.ranked():
+            provider.pending += 1
+            started = time.monotonic()
+            try:
+                await provider.acquire()
+                # Queueing is already counted in expected_wait, so time the call alone
+                started = time.monotonic()
+                calls += 1
+                rewrite = await provider.correct_text(text, acquire=False)
+            except Exception as e:
+                logger.error(f"Rewrite provider {provider.name} failed: {e}")
+                rewrite = None
+            finally:
+                provider.pending -= 1
+
+            elapsed = time.monotonic() - started
+            provider.record(elapsed, bool(rewrite))
+            logger.info(
+                f"Rewrite via {provider.name} took {elapsed:.2f}s "
+                f"({'ok' if rewrite else 'failed'})"
+            )
+
+            if rewrite:
+                g.cache_put(text, rewrite)
+                return rewrite, calls
+
+        return None, calls
+
+    async def correct_many(
+        self,
+        texts: List[str],
+        send_stream: ObjectSendStream,
+        concurrency: int
+    ):
+        """Rewrite texts concurrently, sending (index, rewrite, error) as each finishes"""
+        limiter = anyio.CapacityLimiter(max(1, concurrency))
+
+        async def correct_item(index: int, text: str, stream: ObjectSendStream):
+            async with stream:
+                try:
+                    # Cache hits skip the concurrency slot entirely
+                    rewrite = g.cache_get(text)
+                    if rewrite is None:
+                        async with limiter:
+                            rewrite = await self.correct_text(text)
+                except Exception as e:
+                    logger.error(f"Batch item {index} failed: {e}")
+                    rewrite = None
+                error = None if rewrite else "Rewrite failed"
+                try:
+                    await stream.send((index, rewrite, error))
+                except anyio.BrokenResourceError:
+                    # Nobody is reading any more: give the remaining items' slots back
+                    tg.cancel_scope.cancel()
+
+        async with send_stream, anyio.create_task_group() as tg:
+            for index, text in enumerate(texts):
+                tg.start_soon(correct_item, index, text, send_stream.clone())
+
+    def stats(self) -> Dict[str, dict]:
+        return {p.name: p.stats() for p in self.providers}
+
+_available = {
+    'gemini': lambda: RewriteProvider('gemini', g.acquire, g.correct_text, g.requests_per_second),
+    'openai': lambda: RewriteProvider('openai', o.acquire, o.correct_text, o.requests_per_second),
+}
+
+rewrite_router = RewriteRouter(
+    [_available[name]() for name in REWRITE_PROVIDERS if name in _available],
+    spill_after=REWRITE_SPILL_AFTER
+)
@@ -0,0 +1,184 @@
+import os
+import time
+import shutil
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, Optional
+from uuid import uuid4
+
+from common.config import SCRATCH_CFG
+from common.metrics import registry, waiters
+
+import anyio
+from anyio import to_thread
+
+logger = logging.getLogger("scratch")
+
+scratch_bytes = registry.gauge(
+    "transcriptron_scratch_bytes", "Scratch space reserved or written by this process"
+)
+scratch_rejected_total = registry.counter(
+    "transcriptron_scratch_rejected_total", "Conversions refused because scratch space stayed full"
+)
+scratch_orphans_removed_total = registry.counter(
+    "transcriptron_scratch_orphans_removed_total", "Leftover scratch files removed by cleanup"
+)
+
+class ScratchSpace:
+    """
+    Temp files for conversions under one root. Each file reserves an
+    estimated size up front; new reservations wait while this process is
+    over quota or the filesystem is low on free space, and give up after
+    wait_timeout. Files are named <pid>-<uuid><suffix> so cleanup can tell
+    which ones belong to processes that are gone.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        quota_bytes: int,
+        min_free_bytes: int,
+        default_estimate: int,
+        wait_timeout: float,
+        orphan_age: int
+    ):
+        self.root = Path(root)
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.default_estimate = default_estimate
+        self.wait_timeout = wait_timeout
+        self.orphan_age = orphan_age
+        self._files: Dict[Path, int] = {}
+        self._condition: Optional[anyio.Condition] = None
+        self._waiting = 0
+        self._root_ready = False
+
+    @property
+    def in_use(self) -> int:
+        return sum(self._files.values())
+
+    def _ensure_root(self):
+        if not self._root_ready:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._root_ready = True
+
+    def _fits(self, estimate: int) -> bool:
+        # A job larger than the whole quota still runs once nothing else does
+        if self._files and self.in_use + estimate > self.quota_bytes:
+            return False
+        return shutil.disk_usage(self.root).free - estimate >= self.min_free_bytes
+
+    async def _reserve(self, suffix: str, estimate: int) -> Optional[Path]:
+        if self._condition is None:
+            self._condition = anyio.Condition()
+        self._ensure_root()
+
+        deadline = time.monotonic() + self.wait_timeout
+        async with self._condition:
+            while not self._fits(estimate):
+                if time.monotonic() >= deadline:
+                    return None
+                self._waiting += 1
+                try:
+                    # Free space can change outside this process, so recheck periodically
+                    with anyio.move_on_after(min(1.0, max(0.0, deadline - time.monotonic()))):
+                        await self._condition.wait()
+                finally:
+                    self._waiting -= 1
+
+            path = self.root / f"{os.getpid()}-{uuid4().hex}{suffix}"
+            self._files[path] = estimate
+            scratch_bytes.set(self.in_use)
+            return path
+
+    async def _release(self, path: Path):
+        await to_thread.run_sync(self._remove, path)
+        self._files.pop(path, None)
+        scratch_bytes.set(self.in_use)
+        if self._condition is not None:
+            async with self._condition:
+                self._condition.notify_all()
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            path.unlink(missing_ok=True)
+        except OSError as e:
+            logger.error(f"Failed to remove scratch file {path}: {e}")
+
+    @asynccontextmanager
+    async def file(self, suffix: str = "", estimate: Optional[int] = None):
+        """
+        Yields a fresh path, or None when no space freed up within
+        wait_timeout. The file is deleted when the block exits, however
+        it exits, including on cancellation.
+        """
+        estimate = estimate or self.default_estimate
+        path = await self._reserve(suffix, estimate)
+        if path is None:
+            scratch_rejected_total.inc()
+            logger.error(
+                f"No scratch space for {estimate} bytes after {self.wait_timeout:.0f}s "
+                f"({self.in_use} bytes in use)"
+            )
+            yield None
+            return
+
+        try:
+            yield path
+        finally:
+            with anyio.CancelScope(shield=True):
+                await self._release(path)
+
+    def track(self, path: Path):
+        """Replaces a file's estimate with its real size once written"""
+        if path in self._files:
+            try:
+                self._files[path] = path.stat().st_size
+            except OSError:
+                return
+            scratch_bytes.set(self.in_use)
+
+    def cleanup(self) -> int:
+        """
+        Removes files left by processes that are gone, and anything older
+        than orphan_age that this process is not using. Blocking; run it
+        in a thread.
+        """
+        if not self.root.exists():
+            return 0
+        removed = 0
+        now = time.time()
+        for entry in os.scandir(self.root):
+            path = Path(entry.path)
+            if not entry.is_file() or path in self._files:
+                continue
+            try:
+                owner = int(entry.name.split("-", 1)[0])
+            except ValueError:
+                owner = None
+            try:
+                age = now - entry.stat().st_mtime
+            except OSError:
+                continue
+            # Our own live files are always in _files, so an untracked one is stale
+            if owner == os.getpid() or (owner is not None and not _alive(owner)) or age > self.orphan_age:
+                self._remove(path)
+                removed += 1
+        if removed:
+            scratch_orphans_removed_total.inc(removed)
+            logger.info(f"Removed {removed} orphaned scratch files from {self.root}")
+        return removed
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+scratch = ScratchSpace(**SCRATCH_CFG)
+waiters.set_function(lambda: scratch._waiting, resource="scratch")
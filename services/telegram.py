@@ -2,30 +2,45 @@ import logging
 from urllib.parse import quote
 from typing import Optional, Dict, Any, Union
 import json
+import time
 
-from common.config import TELEGRAM_TOKEN
+from common.config import TELEGRAM_TOKEN, TELEGRAM_API_URL, SERVICE_PROCESSES
 
 import anyio
 from anyio import to_thread, Semaphore
 import httpx
 from asynciolimiter import StrictLimiter
 
+from common.metrics import telegram_call_seconds, rate_limited_total, waiters, limiter_waiters, CountingLimiter
+from common.tracing import span
+from common.utils import split_message
+
 logger = logging.getLogger("telegram")
 
 class TelegramBot:
 
-    api_url = f"http://127.0.0.1:8081/bot{TELEGRAM_TOKEN}/"
-    _rate_limiter = StrictLimiter(30/1)
-    _message_rate_limiter = StrictLimiter(1)
+    api_url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_TOKEN}/"
+    # This process's share of the bot-wide limits
+    _rate_limiter = CountingLimiter(StrictLimiter(30/1 / SERVICE_PROCESSES))
+    _message_rate_limiter = CountingLimiter(StrictLimiter(1 / SERVICE_PROCESSES))
     
     @classmethod
     async def call(cls, method: str, files: Optional[Dict] = None, **kwargs) -> Optional[Any]:
         
-        await cls._rate_limiter.wait()
+        with span("telegram.limiter_wait"):
+            await cls._rate_limiter.wait()
+
+        with span(f"telegram.{method}"):
+            return await cls._call(method, files, **kwargs)
+
+    @classmethod
+    async def _call(cls, method: str, files: Optional[Dict] = None, **kwargs) -> Optional[Any]:
 
         url = f"{cls.api_url}{method}"
-        logger.info(f"Making API call to {url} with parameters: {kwargs}")
+        logger.info(f"Making API call to {method} with parameters: {sorted(kwargs)}")
+        logger.debug(f"API call to {method} parameters: {kwargs}")
         
+        started = time.perf_counter()
         async with httpx.AsyncClient() as client:
             try:
                 data = {}
@@ -40,20 +55,26 @@ class TelegramBot:
                 else:
                     response = await client.post(url, data=data)
                     
+                telegram_call_seconds.observe(time.perf_counter() - started, method=method)
+
+                if response.status_code == 429:
+                    rate_limited_total.inc(service="telegram")
+
                 if response.status_code == 200:
                     response_data = response.json()
                     if not response_data.get('ok'):
-                        logger.warning(f"API call to {url} failed with error: {response_data.get('description')}")
+                        logger.warning(f"API call to {method} failed with error: {response_data.get('description')}")
                         return None
                     
-                    logger.info(f"API call to {url} succeeded")
+                    logger.info(f"API call to {method} succeeded")
                     return response_data.get('result')
                 else:
-                    logger.error(f"API call to {url} failed with status code {response.status_code} and response: {response.text}")
+                    logger.error(f"API call to {method} failed with status code {response.status_code} and response: {response.text}")
                     return None
                     
             except httpx.RequestError as e:
-                logger.exception(f"An error occurred while making API call to {url}: {e}")
+                telegram_call_seconds.observe(time.perf_counter() - started, method=method)
+                logger.exception(f"An error occurred while making API call to {method}: {e}")
                 return None
 
     @classmethod
@@ -72,23 +93,7 @@ class TelegramBot:
         # Split long messages
         logger.info(f"Message exceeds {TELEGRAM_MAX_LENGTH} characters ({len(text)}), splitting into chunks")
         
-        chunks = []
-        remaining_text = text
-        
-        while remaining_text:
-            if len(remaining_text) <= TELEGRAM_MAX_LENGTH:
-                chunks.append(remaining_text)
-                break
-            
-            # Find a good split point (prefer newline, then space)
-            split_index = remaining_text.rfind('\n', 0, TELEGRAM_MAX_LENGTH)
-            if split_index == -1 or split_index < TELEGRAM_MAX_LENGTH * 0.8:  # Don't split too early
-                split_index = remaining_text.rfind(' ', 0, TELEGRAM_MAX_LENGTH)
-            if split_index == -1:
-                split_index = TELEGRAM_MAX_LENGTH
-            
-            chunks.append(remaining_text[:split_index])
-            remaining_text = remaining_text[split_index:].lstrip()
+        chunks = split_message(text, TELEGRAM_MAX_LENGTH)
         
         logger.info(f"Split message into {len(chunks)} chunks")
         
@@ -114,4 +119,7 @@ class TelegramBot:
     async def get_file(cls, file_id):
         response = await cls.call("getFile", file_id=file_id)
         path = response.get("file_path")
-        return path
\ No newline at end of file
+        return path
+
+waiters.set_function(limiter_waiters(TelegramBot._rate_limiter), resource="telegram_limiter")
+waiters.set_function(limiter_waiters(TelegramBot._message_rate_limiter), resource="telegram_message_limiter")
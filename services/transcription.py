@@ -0,0 +1,51 @@
+import hashlib
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import anyio
+from anyio import to_thread
+
+class TranscriptionBackend(ABC):
+    """
+    Turns a 16 kHz mono WAV from FFmpegManager.save_audio into text.
+    transcribe returns None on failure rather than raising, so the router
+    can fall through to the next backend.
+    """
+
+    name = "backend"
+
+    @abstractmethod
+    async def transcribe(self, input_file) -> Optional[str]:
+        ...
+
+class StubBackend(TranscriptionBackend):
+    """
+    Deterministic stand-in for tests and benchmarks: the text depends only on
+    the file's content and length, and an optional delay per second of audio
+    imitates a real engine's speed.
+    """
+
+    name = "stub"
+
+    # 16 kHz mono 16-bit PCM
+    bytes_per_second = 32000
+
+    def __init__(self, seconds_per_audio_second: float = 0.0, fail: bool = False):
+        self.seconds_per_audio_second = seconds_per_audio_second
+        self.fail = fail
+
+    async def transcribe(self, input_file) -> Optional[str]:
+        content = await to_thread.run_sync(self._read_file, input_file)
+        seconds = len(content) / self.bytes_per_second
+        if self.seconds_per_audio_second:
+            await anyio.sleep(seconds * self.seconds_per_audio_second)
+        if self.fail:
+            return None
+        digest = hashlib.sha1(content).hexdigest()[:12]
+        words = " ".join(["lorem"] * max(1, int(seconds * 2)))
+        return f"[{digest}] {words}"
+
+    @staticmethod
+    def _read_file(file_path):
+        with open(file_path, "rb") as f:
+            return f.read()
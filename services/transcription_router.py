@@ -0,0 +1,144 @@
+import logging
+import time
+from typing import Dict, List, Optional
+
+from common.config import (
+    TRANSCRIBE_BACKENDS, TRANSCRIBE_LOCAL_MAX_SECONDS, TRANSCRIBE_LOCAL_MAX_QUEUE, LOCAL_WHISPER_CFG
+)
+from common.metrics import registry
+from services.transcription import TranscriptionBackend, StubBackend
+
+logger = logging.getLogger("transcription")
+
+transcriptions_total = registry.counter(
+    "transcriptron_transcriptions_total", "Transcription attempts by backend and outcome", ("backend", "outcome")
+)
+transcription_audio_seconds_total = registry.counter(
+    "transcriptron_transcription_audio_seconds_total", "Audio seconds sent to each backend", ("backend",)
+)
+
+class TranscriptionProvider:
+    """
+    A backend plus the limits under which the router may pick it: clips up to
+    max_seconds long, while fewer than max_queue clips are already pending.
+    None means unlimited.
+    """
+
+    def __init__(
+        self,
+        backend: TranscriptionBackend,
+        max_seconds: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        alpha: float = 0.2
+    ):
+        self.backend = backend
+        self.name = backend.name
+        self.max_seconds = max_seconds
+        self.max_queue = max_queue
+        self.alpha = alpha
+        self.pending = 0
+        self.calls = 0
+        self.errors = 0
+        # EWMA of processing seconds per audio second
+        self.realtime_factor = 0.0
+
+    def admits(self, duration: float) -> bool:
+        if self.max_seconds is not None and duration > self.max_seconds:
+            return False
+        return self.max_queue is None or self.pending < self.max_queue
+
+    def record(self, elapsed: float, duration: float, ok: bool):
+        self.calls += 1
+        if not ok:
+            self.errors += 1
+            return
+        if duration > 0:
+            factor = elapsed / duration
+            self.realtime_factor = (
+                self.alpha * factor + (1 - self.alpha) * self.realtime_factor if self.realtime_factor else factor
+            )
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'calls': self.calls,
+            'errors': self.errors,
+            'realtime_factor': round(self.realtime_factor, 3),
+            'max_seconds': self.max_seconds,
+            'max_queue': self.max_queue,
+        }
+
+class TranscriptionRouter:
+
+    def __init__(self, providers: List[TranscriptionProvider]):
+        self.providers = providers
+
+    def ranked(self, duration: float) -> List[TranscriptionProvider]:
+        # Configured order among the providers that admit the clip; the last
+        # provider is the catch-all when none do, and the fallback when they fail
+        admitted = [p for p in self.providers if p.admits(duration)]
+        if self.providers and self.providers[-1] not in admitted:
+            admitted.append(self.providers[-1])
+        return admitted
+
+    async def transcribe(self, input_file, duration: float) -> str | None:
+        for provider in self.ranked(duration):
+            provider.pending += 1
+            started = time.monotonic()
+            try:
+                transcription = await provider.backend.transcribe(input_file)
+            except Exception as e:
+                logger.error(f"Transcription backend {provider.name} failed: {e}")
+                transcription = None
+            finally:
+                provider.pending -= 1
+
+            elapsed = time.monotonic() - started
+            provider.record(elapsed, duration, bool(transcription))
+            transcriptions_total.inc(backend=provider.name, outcome="ok" if transcription else "failed")
+            transcription_audio_seconds_total.inc(duration, backend=provider.name)
+            logger.info(
+                f"Transcription of {duration:.1f}s via {provider.name} took {elapsed:.2f}s "
+                f"({'ok' if transcription else 'failed'})"
+            )
+
+            if transcription:
+                return transcription
+
+        return None
+
+    def stats(self) -> Dict[str, dict]:
+        return {p.name: p.stats() for p in self.providers}
+
+def _openai():
+    from services.openai_manager import openai_manager
+    return TranscriptionProvider(openai_manager)
+
+def _local():
+    if not LOCAL_WHISPER_CFG['model_path']:
+        raise ValueError("TRANSCRIBE_BACKENDS includes local but LOCAL_WHISPER_MODEL is not set")
+    from services.local_whisper import local_whisper
+    return TranscriptionProvider(
+        local_whisper, max_seconds=TRANSCRIBE_LOCAL_MAX_SECONDS, max_queue=TRANSCRIBE_LOCAL_MAX_QUEUE
+    )
+
+_available = {
+    'openai': _openai,
+    'local': _local,
+    'stub': lambda: TranscriptionProvider(StubBackend()),
+}
+
+def build_router(names: List[str]) -> TranscriptionRouter:
+    """Fails at startup on a bad TRANSCRIBE_BACKENDS rather than on every file later"""
+    unknown = [name for name in names if name not in _available]
+    if unknown:
+        raise ValueError(
+            f"Unknown TRANSCRIBE_BACKENDS {', '.join(unknown)}; choose from {', '.join(_available)}"
+        )
+    if not names:
+        raise ValueError("TRANSCRIBE_BACKENDS names no transcription backend")
+    router = TranscriptionRouter([_available[name]() for name in names])
+    logger.info(f"Transcription backends: {', '.join(names)}")
+    return router
+
+transcription_router = build_router(TRANSCRIBE_BACKENDS)
@@ -0,0 +1,202 @@
+import re
+import logging
+import base64
+from datetime import datetime
+from typing import Optional, List, Tuple
+
+from common.mysql import MySQL as db, write_behind
+from anyio import Lock
+
+logger = logging.getLogger("mysql")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    from_id BIGINT NOT NULL,
+    message_id BIGINT NULL,
+    created_at DATETIME(6) NOT NULL,
+    text MEDIUMTEXT NOT NULL,
+    PRIMARY KEY (id),
+    KEY idx_from_created (from_id, created_at),
+    KEY idx_created (created_at),
+    FULLTEXT KEY ft_text (text)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+INSERT = "INSERT INTO transcripts (from_id, message_id, created_at, text) VALUES (%s, %s, %s, %s)"
+
+# Relevance pages stop here; ranking deeper than this is not worth an offset scan
+MAX_RELEVANCE_RESULTS = 1000
+
+# ER_PARSE_ERROR, raised by InnoDB for malformed boolean-mode queries
+ER_PARSE_ERROR = 1064
+
+class InvalidSearch(ValueError):
+    pass
+
+def check_boolean_query(q: str):
+    """Rejects the boolean-mode syntax errors MySQL would otherwise raise"""
+    if q.count('"') % 2:
+        raise InvalidSearch("Unbalanced quotes in q")
+    depth = 0
+    # Parentheses inside a quoted phrase are just text
+    for char in re.sub(r'"[^"]*"', ' ', q):
+        depth += (char == "(") - (char == ")")
+        if depth < 0:
+            break
+    if depth:
+        raise InvalidSearch("Unbalanced parentheses in q")
+    if not any(c.isalnum() for c in q):
+        raise InvalidSearch("q has no search terms")
+
+def _errno(e: Exception) -> Optional[int]:
+    # mysql.connector sets errno; aiomysql passes it as the first argument
+    errno = getattr(e, 'errno', None)
+    if errno is None and e.args and isinstance(e.args[0], int):
+        errno = e.args[0]
+    return errno
+
+class TranscriptArchive:
+
+    _schema_ready = False
+    _schema_lock = Lock()
+
+    @classmethod
+    async def ensure_schema(cls):
+        if cls._schema_ready:
+            return
+        async with cls._schema_lock:
+            if not cls._schema_ready:
+                await db.aexecute_update(SCHEMA)
+                cls._schema_ready = True
+                logger.info("Transcript archive schema ready")
+
+    @classmethod
+    async def add(cls, from_id: int, message_id: Optional[int], text: str):
+        await cls.ensure_schema()
+        await write_behind.add(INSERT, (from_id, message_id, datetime.now(), text))
+
+    @staticmethod
+    def encode_cursor(created_at: datetime, row_id: int) -> str:
+        raw = f"{created_at.isoformat()}|{row_id}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+
+    @staticmethod
+    def encode_offset_cursor(offset: int) -> str:
+        return base64.urlsafe_b64encode(f"offset|{offset}".encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_offset_cursor(cursor: str) -> int:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        kind, offset = base64.urlsafe_b64decode(padded).decode().split("|")
+        if kind != "offset" or not 0 <= int(offset) < MAX_RELEVANCE_RESULTS:
+            raise ValueError("Invalid cursor")
+        return int(offset)
+
+    @classmethod
+    async def search(
+        cls,
+        q: Optional[str] = None,
+        from_id: Optional[int] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Without q: newest-first keyset pagination over (created_at, id),
+        served by (from_id, created_at) or created_at, so no page scans the
+        whole table.
+
+        With q and from_id: the same keyset pages, walking one user's rows
+        through idx_from_created and keeping those MATCH accepts. A page
+        reads that user's rows until it has enough matches, never anyone
+        else's.
+
+        With q alone: most relevant first. Ordering by MATCH lets InnoDB
+        take the top rows from the FULLTEXT ranking instead of filesorting
+        every match by date. This path is not keyset paginated: pages are
+        offsets, capped at MAX_RELEVANCE_RESULTS, and a common term is
+        ranked across the whole table before the first page returns.
+
+        Raises InvalidSearch (a ValueError) for a malformed q.
+        """
+        await cls.ensure_schema()
+
+        if q and from_id is None:
+            return await cls._search_relevance(q, limit, cursor)
+
+        where = []
+        params = []
+
+        if q:
+            check_boolean_query(q)
+            where.append("MATCH(text) AGAINST (%s IN BOOLEAN MODE)")
+            params.append(q)
+
+        if from_id is not None:
+            where.append("from_id = %s")
+            params.append(from_id)
+        if cursor:
+            created_at, row_id = cls.decode_cursor(cursor)
+            where.append("(created_at < %s OR (created_at = %s AND id < %s))")
+            params.extend([created_at, created_at, row_id])
+
+        query = (
+            "SELECT id, from_id, message_id, created_at, text FROM transcripts"
+            # Left to itself the optimizer picks the FULLTEXT index for MATCH,
+            # which ranks every user's matches before from_id filters them
+            + (" FORCE INDEX (idx_from_created)" if q else "")
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY created_at DESC, id DESC LIMIT %s"
+        )
+        params.append(limit + 1)
+
+        rows = await cls._query(query, params)
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = cls.encode_cursor(last['created_at'], last['id'])
+
+        return rows, next_cursor
+
+    @classmethod
+    async def _search_relevance(
+        cls,
+        q: str,
+        limit: int,
+        cursor: Optional[str]
+    ) -> Tuple[List[dict], Optional[str]]:
+        check_boolean_query(q)
+        offset = cls.decode_offset_cursor(cursor) if cursor else 0
+        limit = min(limit, MAX_RELEVANCE_RESULTS - offset)
+
+        query = (
+            "SELECT id, from_id, message_id, created_at, text FROM transcripts"
+            " WHERE MATCH(text) AGAINST (%s IN BOOLEAN MODE)"
+            " ORDER BY MATCH(text) AGAINST (%s IN BOOLEAN MODE) DESC LIMIT %s OFFSET %s"
+        )
+        rows = await cls._query(query, [q, q, limit + 1, offset])
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            if offset + limit < MAX_RELEVANCE_RESULTS:
+                next_cursor = cls.encode_offset_cursor(offset + limit)
+
+        return rows, next_cursor
+
+    @staticmethod
+    async def _query(query: str, params: list) -> List[dict]:
+        try:
+            return await db.aexecute_query(query, tuple(params))
+        except Exception as e:
+            if _errno(e) == ER_PARSE_ERROR:
+                raise InvalidSearch("Malformed search query") from e
+            raise
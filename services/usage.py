@@ -0,0 +1,174 @@
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Tuple, Optional
+
+from common.config import USAGE_QUOTAS
+from common.mysql import MySQL as db, write_behind
+from anyio import Lock
+
+logger = logging.getLogger("usage")
+
+FIELDS = ('audio_seconds', 'whisper_calls', 'gemini_calls', 'bytes_processed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage_hourly (
+    from_id BIGINT NOT NULL,
+    bucket DATETIME NOT NULL,
+    audio_seconds DOUBLE NOT NULL DEFAULT 0,
+    whisper_calls INT NOT NULL DEFAULT 0,
+    gemini_calls INT NOT NULL DEFAULT 0,
+    bytes_processed BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (from_id, bucket),
+    KEY idx_bucket (bucket)
+) ENGINE=InnoDB
+"""
+
+# Reconciliation adds negative corrections through the same statement, so the
+# columns are signed and the rows for a bucket sum to the same total in
+# whatever order write-behind happens to write them
+UPSERT = """
+INSERT INTO usage_hourly (from_id, bucket, audio_seconds, whisper_calls, gemini_calls, bytes_processed)
+VALUES (%s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    audio_seconds = audio_seconds + VALUES(audio_seconds),
+    whisper_calls = whisper_calls + VALUES(whisper_calls),
+    gemini_calls = gemini_calls + VALUES(gemini_calls),
+    bytes_processed = bytes_processed + VALUES(bytes_processed)
+"""
+
+MEDIA_KINDS = ('video', 'voice', 'audio', 'video_note')
+
+class UsageMeter:
+    """
+    Per-user hourly usage counters, checked against quotas at admission and
+    flushed to MySQL. Admission charges an estimate from Telegram's metadata;
+    workers later report what the job really used and reconcile() corrects
+    the bucket the estimate went into.
+    """
+
+    def __init__(self, quotas: Dict[str, Dict[str, float]]):
+        self.quotas = quotas
+        self._buckets: Dict[Tuple[int, int], Dict[str, float]] = {}
+        self._unflushed: Dict[Tuple[int, int], Dict[str, float]] = {}
+        self._loaded = False
+        self._load_lock = Lock()
+
+    @staticmethod
+    def _hour(ts: Optional[float] = None) -> int:
+        return int((ts or time.time()) // 3600)
+
+    @staticmethod
+    def estimate(message: dict) -> Dict[str, float]:
+        """Usage a Telegram message will cost, from the metadata Telegram already sends"""
+        for kind in MEDIA_KINDS:
+            if kind in message:
+                media = message.get(kind) or {}
+                return {
+                    'audio_seconds': float(media.get('duration') or 0),
+                    'whisper_calls': 1,
+                    'bytes_processed': int(media.get('file_size') or 0),
+                }
+        text = message.get('text')
+        if text:
+            return {'gemini_calls': 1, 'bytes_processed': len(text.encode())}
+        return {}
+
+    async def load(self):
+        """Seeds the rolling window from MySQL so a restart doesn't reset quotas"""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                await db.aexecute_update(SCHEMA)
+                since = datetime.fromtimestamp((self._hour() - 23) * 3600)
+                rows = await db.aexecute_query(
+                    f"SELECT from_id, bucket, {', '.join(FIELDS)} FROM usage_hourly WHERE bucket >= %s",
+                    (since,)
+                )
+                for row in rows:
+                    key = (row['from_id'], self._hour(row['bucket'].timestamp()))
+                    bucket = self._buckets.setdefault(key, dict.fromkeys(FIELDS, 0))
+                    for field in FIELDS:
+                        bucket[field] += float(row[field] or 0)
+                logger.info(f"Loaded {len(rows)} usage buckets")
+            except Exception as e:
+                logger.error(f"Failed to load usage from MySQL: {e}")
+            self._loaded = True
+
+    def record(self, from_id: int, hour: Optional[int] = None, **amounts: float):
+        key = (from_id, self._hour() if hour is None else hour)
+        for target in (self._buckets, self._unflushed):
+            bucket = target.setdefault(key, dict.fromkeys(FIELDS, 0))
+            for field, amount in amounts.items():
+                bucket[field] += amount
+
+    def usage(self, from_id: int, hours: int) -> Dict[str, float]:
+        now = self._hour()
+        total = dict.fromkeys(FIELDS, 0)
+        for hour in range(now - hours + 1, now + 1):
+            bucket = self._buckets.get((from_id, hour))
+            if bucket:
+                for field in FIELDS:
+                    total[field] += bucket[field]
+        total['requests'] = total['whisper_calls'] + total['gemini_calls']
+        return total
+
+    def exceeded(self, from_id: int, amounts: Dict[str, float]) -> Optional[str]:
+        """Name of the first quota this work would push the user over, if any"""
+        pending = dict(amounts)
+        pending['requests'] = pending.get('whisper_calls', 0) + pending.get('gemini_calls', 0)
+        for window, hours in (('hourly', 1), ('daily', 24)):
+            used = self.usage(from_id, hours)
+            for field, limit in self.quotas.get(window, {}).items():
+                if limit and used.get(field, 0) + pending.get(field, 0) > limit:
+                    return f"{window} {field}"
+        return None
+
+    async def admit(self, from_id: int, message: dict) -> Tuple[Optional[str], Optional[dict]]:
+        """
+        Returns (quota it would exceed, None), or records the estimated usage
+        and returns (None, ticket). The ticket travels with the job so the
+        worker can report actual usage against it.
+        """
+        await self.load()
+        amounts = self.estimate(message)
+        if not amounts:
+            return None, None
+        reason = self.exceeded(from_id, amounts)
+        if reason:
+            return reason, None
+        hour = self._hour()
+        self.record(from_id, hour, **amounts)
+        return None, {'hour': hour, 'estimated': amounts}
+
+    def reconcile(self, from_id: int, ticket: dict, actual: Dict[str, float]):
+        """Replaces an admitted estimate with the usage the job really had"""
+        hour = ticket['hour']
+        if hour < self._hour() - 23:
+            return
+        estimated = ticket['estimated']
+        delta = {
+            field: actual.get(field, estimated.get(field, 0)) - estimated.get(field, 0)
+            for field in FIELDS
+        }
+        if any(delta.values()):
+            self.record(from_id, hour, **delta)
+
+    async def flush(self):
+        unflushed, self._unflushed = self._unflushed, {}
+        for (from_id, hour), bucket in unflushed.items():
+            await write_behind.add(UPSERT, (
+                from_id,
+                datetime.fromtimestamp(hour * 3600),
+                *(bucket[field] for field in FIELDS)
+            ))
+
+        # Keep only the rolling day the quotas look at
+        oldest = self._hour() - 23
+        for key in [key for key in self._buckets if key[1] < oldest]:
+            del self._buckets[key]
+
+usage_meter = UsageMeter(USAGE_QUOTAS)